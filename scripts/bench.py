@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+from pathlib import Path
+from dataclasses import asdict, dataclass
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, Dict, List, TypeVar
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import statistics
+import sys
+import tracemalloc
+
+
+SCRIPTS_DIR = Path(__file__).parent.absolute()
+ROOT_DIR = SCRIPTS_DIR.parent
+SRC_DIR = ROOT_DIR / 'src'
+sys.path.insert(0, str(SRC_DIR))
+
+from compiller import (  # noqa: E402
+    PARSERS,
+    Source,
+    __version__,
+    is_parser_available,
+    process_file,
+)
+from compiller.component.gen import render_page  # noqa: E402
+from compiller.component.imports import (  # noqa: E402
+    ImportsCache,
+    parse_imports_and_remove_them,
+)
+from compiller.component.uniques import UniquesGenerator  # noqa: E402
+from minify_html import minify  # noqa: E402
+
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True, kw_only=True)
+class Project:
+    components: int
+    depth: int
+    fan_out: int
+    usages: int
+    nesting: int
+
+
+# Components are split into `depth` levels. Every component imports
+# `fan_out` components of the next level, the page uses the first level
+def generate(project: Project, dir: Path) -> Path:
+    levels = _level_sizes(project)
+    for level, size in enumerate(levels):
+        for index in range(size):
+            imported = []
+            if level + 1 < len(levels):
+                imported = [
+                    _component_name(level + 1, (index * project.fan_out + k)
+                                    % levels[level + 1])
+                    for k in range(project.fan_out)
+                ]
+            name = _component_name(level, index)
+            with open(dir / (name + '.htmlp'), 'w') as file:
+                file.write(_component(name, sorted(set(imported))))
+    page = dir / 'main.htmlp'
+    with open(page, 'w') as file:
+        file.write(_page(project, levels[0]))
+    return page
+
+
+def _level_sizes(project: Project) -> List[int]:
+    depth = max(1, min(project.depth, project.components))
+    sizes = [project.components // depth] * depth
+    for level in range(project.components % depth):
+        sizes[level] += 1
+    return sizes
+
+
+def _component_name(level: int, index: int) -> str:
+    return f"C{level}_{index}"
+
+
+def _component(name: str, imported: List[str]) -> str:
+    imports = ''.join(f'<import path="{i}.htmlp"/>\n' for i in imported)
+    usages = ''.join(
+        f'        <{i} title="$title"><span>from {name}</span></{i}>\n'
+        for i in imported
+    )
+    return (
+        f"{imports}"
+        f'<template args="title ?kind">\n'
+        f'    <div class="c-{name} $kind" id="!root">\n'
+        f'        <h3 title="$title">{name} &amp; co</h3>\n'
+        f"{usages}"
+        f'        <label for="!root">$title</label>\n'
+        f"        $children\n"
+        f"    </div>\n"
+        f"</template>\n"
+        f"<style>.c-{name} {{ color: red; }}</style>\n"
+    )
+
+
+def _page(project: Project, used: int) -> str:
+    imports = ''.join(
+        f'        <import path="{_component_name(0, i)}.htmlp"/>\n'
+        for i in range(used)
+    )
+    body = ''.join(
+        '        ' + _usage(_component_name(0, u % used), u, project.nesting)
+        + '\n'
+        for u in range(project.usages)
+    )
+    return (
+        "<!DOCTYPE html>\n"
+        "<html>\n"
+        "    <head>\n"
+        f"{imports}"
+        "        <title>Benchmark</title>\n"
+        "    </head>\n"
+        "    <body>\n"
+        f"{body}"
+        "    </body>\n"
+        "</html>\n"
+    )
+
+
+def _usage(name: str, number: int, nesting: int) -> str:
+    if nesting == 0:
+        children = f"<p>usage {number}</p>"
+    else:
+        children = _usage(name, number, nesting - 1)
+    return f'<{name} title="t{number}" kind="k">{children}</{name}>'
+
+
+def _timed(
+    timings: Dict[str, List[float]],
+    phase: str,
+    action: Callable[[], T],
+) -> T:
+    start = perf_counter()
+    result = action()
+    timings.setdefault(phase, []).append(perf_counter() - start)
+    return result
+
+
+# Every run starts with cold caches
+def measure_phases(
+    page: Path,
+    parser: str,
+    repeat: int,
+) -> Dict[str, List[float]]:
+    timings: Dict[str, List[float]] = dict()
+    for _ in range(repeat):
+        src = _timed(timings, 'parse', lambda: Source(page, parser=parser))
+        imports = _timed(timings, 'imports', lambda: (
+            parse_imports_and_remove_them(
+                src,
+                page.parent,
+                ImportsCache(parser=parser),
+            )
+        ))
+        chunks: List[str] = []
+        _timed(timings, 'render', lambda: render_page(
+            imports,
+            src,
+            UniquesGenerator(),
+            chunks.append,
+        ))
+        html = _timed(timings, 'serialize', lambda: ''.join(chunks))
+        _timed(timings, 'minify', lambda: minify(html))
+        _timed(timings, 'total', lambda: process_file(
+            page,
+            page.parent,
+            parser=parser,
+        ))
+    return timings
+
+
+# A new process inherits peak RSS of its parent.
+# Linux allows to reset it, elsewhere the number is an upper bound
+def _reset_peak_rss() -> None:
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_kib() -> int:
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _peak_memory(page: Path, parser: str) -> Dict[str, int]:
+    _reset_peak_rss()
+    before = _peak_rss_kib()
+    minify(process_file(page, page.parent, parser=parser))
+    peak = _peak_rss_kib()
+    tracemalloc.start()
+    minify(process_file(page, page.parent, parser=parser))
+    [_, traced] = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'rss_before_kib': before,
+        'rss_peak_kib': peak,
+        'traced_peak_bytes': traced,
+    }
+
+
+# Measured in a fresh process, so earlier runs don't raise the peak
+def measure_memory(page: Path, parser: str) -> Dict[str, int]:
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(_peak_memory, (page, parser))
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'max': max(samples),
+    }
+
+
+def run(project: Project, parsers: List[str], repeat: int) -> Dict:
+    with TemporaryDirectory() as dir:
+        page = generate(project, Path(dir))
+        html = process_file(page, page.parent)
+        results = []
+        for parser in parsers:
+            timings = measure_phases(page, parser, repeat)
+            results.append({
+                'parser': parser,
+                'seconds': {
+                    phase: _summary(samples)
+                    for [phase, samples] in timings.items()
+                },
+                'memory': measure_memory(page, parser),
+            })
+    return {
+        'htmlp': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'project': asdict(project),
+        'repeat': repeat,
+        'output_bytes': len(html.encode()),
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='''
+        Compiles a generated project and prints timings
+        of every compilation phase as JSON
+        ''',
+    )
+    parser.add_argument('--components', metavar='N', type=int, default=60)
+    parser.add_argument('--depth', metavar='D', type=int, default=3)
+    parser.add_argument('--fan-out', metavar='F', type=int, default=3)
+    parser.add_argument('--usages', metavar='U', type=int, default=200)
+    parser.add_argument(
+        '--nesting',
+        metavar='C',
+        type=int,
+        default=1,
+        help='Depth of component usages nested as children on the page',
+    )
+    parser.add_argument('--repeat', metavar='R', type=int, default=5)
+    parser.add_argument(
+        '--parser',
+        choices=list(PARSERS.keys()),
+        action='append',
+        help='Parser backend to measure. Default is every installed one',
+    )
+    parser.add_argument(
+        '--output',
+        metavar='FILE',
+        type=str,
+        help='Writes JSON to FILE instead of stdout',
+    )
+    args = parser.parse_args()
+    parsers = args.parser or list(filter(is_parser_available, PARSERS))
+    report = run(
+        Project(
+            components=args.components,
+            depth=args.depth,
+            fan_out=args.fan_out,
+            usages=args.usages,
+            nesting=args.nesting,
+        ),
+        parsers,
+        args.repeat,
+    )
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
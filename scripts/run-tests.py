@@ -4,6 +4,7 @@ import subprocess
 import minify_html
 import sys
 import argparse
+from typing import List
 
 
 ROOT_DIR = Path(__file__).parent.parent
@@ -12,6 +13,7 @@ EXEC = TEST_DIR.parent / 'src' / 'main.py'
 
 
 at_least_one_test_failed: bool = False
+parser: str | None = None
 
 
 def minify(s: str) -> str:
@@ -36,8 +38,13 @@ def fail(dir: Path) -> None:
 
 def popen(dir: Path) -> subprocess.Popen:
     input_file = dir / 'main.htmlp'
+    args: List[str | Path] = [
+        'python', EXEC, '--include-dir', dir, input_file
+    ]
+    if parser is not None:
+        args += ['--parser', parser]
     return subprocess.Popen(
-        ['python', EXEC, '--include-dir', dir, input_file],
+        args,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE
     )
@@ -132,15 +139,22 @@ def run_single_case(dir: Path) -> None:
 
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Doing something')
-    parser.add_argument(
+    argparser = argparse.ArgumentParser(description='Doing something')
+    argparser.add_argument(
         'case',
         type=str,
         nargs='?',
         help='Test case folder name if only single needed'
     )
+    argparser.add_argument(
+        '--parser',
+        type=str,
+        help='HTML parser backend to compile cases with'
+    )
     cases: Path = TEST_DIR / 'cases'
-    test_case = parser.parse_args().case
+    args = argparser.parse_args()
+    test_case = args.case
+    parser = args.parser
     if test_case is not None:
         path: Path = cases / test_case
         if not path.exists():
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+from pathlib import Path
+from typing import Any, Dict
+import json
+import minify_html
+import socket
+import subprocess
+import sys
+import tempfile
+
+
+ROOT_DIR = Path(__file__).parent.parent
+EXEC = ROOT_DIR / 'src' / 'main.py'
+# A server failing in a worker may never answer
+TIMEOUT = 60
+CASE_DIR = ROOT_DIR / 'test' / 'cases' / 'component--nested'
+
+
+def minify(s: str) -> str:
+    return minify_html.minify(
+        s,
+        keep_html_and_head_opening_tags=True,
+        minify_css=True,
+    )
+
+
+def request(
+    client: socket.socket,
+    reader: Any,
+    body: Dict[str, Any],
+) -> Dict[str, Any]:
+    client.sendall((json.dumps(body) + '\n').encode())
+    line = reader.readline()
+    if line == b'':
+        raise ConnectionError('The server closed the connection')
+    return json.loads(line)
+
+
+# Starts the server, compiles a test case by its path and by its source
+# and compares both answers with the expected output of the case
+def main() -> bool:
+    with open(CASE_DIR / 'expected_output.html') as file:
+        expected = minify(file.read())
+    with open(CASE_DIR / 'main.htmlp') as file:
+        source = file.read()
+    with tempfile.TemporaryDirectory() as dir:
+        path = Path(dir) / 'htmlp.sock'
+        server = subprocess.Popen(
+            ['python', EXEC, 'serve', '--socket', path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            assert server.stdout is not None
+            server.stdout.readline()
+            client = socket.socket(socket.AF_UNIX)
+            client.settimeout(TIMEOUT)
+            client.connect(str(path))
+            reader = client.makefile('rb')
+            requests = {
+                'input': {'id': 1, 'input': str(CASE_DIR / 'main.htmlp')},
+                'source': {
+                    'id': 2,
+                    'source': source,
+                    'include_dir': str(CASE_DIR),
+                },
+            }
+            succeed = True
+            for [name, body] in requests.items():
+                try:
+                    response = request(client, reader, body)
+                except (OSError, ValueError) as e:
+                    succeed = False
+                    print(f"Serve '{name}' - FAIL", e, sep='\n')
+                    break
+                html = response.get('html')
+                if response.get('id') == body['id'] and html is not None \
+                        and minify(html) == expected:
+                    print(f"Serve '{name}' - SUCCESS")
+                else:
+                    succeed = False
+                    print(f"Serve '{name}' - FAIL", response, sep='\n')
+            client.close()
+        finally:
+            server.terminate()
+            [_, stderr] = server.communicate()
+        if not succeed:
+            print('Server stderr:', stderr.decode(sys.stderr.encoding))
+        return succeed
+
+
+if __name__ == '__main__':
+    exit(0 if main() else 1)
@@ -1,21 +1,73 @@
 import argparse
 from pathlib import Path
-from typing import Optional, TextIO
+from typing import List, Optional, cast
+import os
 import sys
 from dataclasses import dataclass
+from compiller import (
+    DEFAULT_CACHE_DIR,
+    DEFAULT_PARSER,
+    PARSERS,
+    VERSION,
+    MinifyOptions,
+    is_parser_available,
+)
 
 
 @dataclass(frozen=True, kw_only=True)
 class Args:
-    out: TextIO
+    # None for stdout
+    output: Optional[Path]
     input: Path
     include_dir: Path
     need_minify: bool
+    minify_options: MinifyOptions
     watch_dir: Optional[Path]
+    cache_dir: Optional[Path]
+    parser: str
+    timings: bool
+    profile: Optional[Path]
+    print_deps: Optional[str]
+    stable_ids: bool
 
 
-def parse_args() -> Args:
+@dataclass(frozen=True, kw_only=True)
+class BuildArgs:
+    src_dir: Path
+    out_dir: Path
+    include_dir: Path
+    need_minify: bool
+    minify_options: MinifyOptions
+    jobs: int
+    cache_dir: Optional[Path]
+    watch: bool
+    parser: str
+    timings: bool
+    profile: Optional[Path]
+    print_deps: Optional[str]
+    stable_ids: bool
+    bundle: Optional[str]
+
+
+@dataclass(frozen=True, kw_only=True)
+class ServeArgs:
+    socket: Path
+    jobs: int
+    cache_dir: Optional[Path]
+    parser: str
+
+
+def parse_args() -> Args | BuildArgs | ServeArgs:
+    if sys.argv[1:2] == ['build']:
+        return _parse_build_args(sys.argv[2:])
+    if sys.argv[1:2] == ['serve']:
+        return _parse_serve_args(sys.argv[2:])
     parser = argparse.ArgumentParser(description='Doing something')
+    parser.add_argument(
+        '--version',
+        action='version',
+        version=f"htmlp {VERSION}",
+    )
     parser.add_argument(
         'input_file',
         type=str,
@@ -39,12 +91,7 @@ def parse_args() -> Args:
         Default is current directory
         ''',
     )
-    parser.add_argument(
-        '--minify',
-        action='store_true',
-        default=False,
-        help='Minifies output',
-    )
+    _add_minify_arguments(parser)
     parser.add_argument(
         '--include-dir',
         metavar='DIR',
@@ -53,6 +100,11 @@ def parse_args() -> Args:
         default='./',
         help='Changes the include dir',
     )
+    _add_cache_dir_argument(parser)
+    _add_parser_argument(parser)
+    _add_profiling_arguments(parser)
+    _add_stable_ids_argument(parser)
+    _add_print_deps_argument(parser)
     args = parser.parse_args()
 
     if args.watch is False:
@@ -63,14 +115,282 @@ def parse_args() -> Args:
         watch = Path(args.watch).absolute()
 
     if args.output_file is None:
-        out = sys.stdout
+        output = None
     else:
-        out = open(args.output_file, 'w')
+        output = Path(args.output_file).absolute()
 
     return Args(
-        out=out,
+        output=output,
         input=Path(args.input_file).absolute(),
         include_dir=Path(args.include_dir).absolute(),
-        need_minify=args.minify,
+        need_minify=_need_minify(args),
+        minify_options=_minify_options(args),
         watch_dir=watch,
+        cache_dir=_cache_dir(args.cache_dir),
+        parser=_parser(parser, args.parser),
+        timings=args.timings,
+        profile=_profile(args.profile),
+        print_deps=args.print_deps,
+        stable_ids=args.stable_ids,
+    )
+
+
+def _parse_build_args(argv: List[str]) -> BuildArgs:
+    parser = argparse.ArgumentParser(
+        prog='main.py build',
+        description='Compiles every page found in the source directory',
+    )
+    parser.add_argument(
+        'src_dir',
+        type=str,
+        help='A directory with pages and components',
+    )
+    parser.add_argument(
+        'out_dir',
+        type=str,
+        help='A directory to put compiled pages in',
+    )
+    _add_minify_arguments(parser)
+    parser.add_argument(
+        '--include-dir',
+        metavar='DIR',
+        type=str,
+        action='store',
+        default=None,
+        help='Changes the include dir. Default is the source directory',
+    )
+    _add_jobs_argument(parser)
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        default=False,
+        help='''
+        Watch source and include directories
+        and recompile pages affected by changed files
+        ''',
+    )
+    parser.add_argument(
+        '--bundle',
+        metavar='NAME',
+        type=str,
+        default=None,
+        help='''
+        Writes styles and scripts of used components to NAME.css and NAME.js
+        in the output directory and links them from pages.
+        By default they are inlined into every page using them
+        ''',
+    )
+    _add_cache_dir_argument(parser)
+    _add_parser_argument(parser)
+    _add_profiling_arguments(parser)
+    _add_stable_ids_argument(parser)
+    _add_print_deps_argument(parser)
+    args = parser.parse_args(argv)
+
+    src_dir = Path(args.src_dir).absolute()
+    if args.include_dir is None:
+        include_dir = src_dir
+    else:
+        include_dir = Path(args.include_dir).absolute()
+
+    return BuildArgs(
+        src_dir=src_dir,
+        out_dir=Path(args.out_dir).absolute(),
+        include_dir=include_dir,
+        need_minify=_need_minify(args),
+        minify_options=_minify_options(args),
+        jobs=_jobs(args.jobs),
+        cache_dir=_cache_dir(args.cache_dir),
+        watch=args.watch,
+        parser=_parser(parser, args.parser),
+        timings=args.timings,
+        profile=_profile(args.profile),
+        bundle=args.bundle,
+        print_deps=args.print_deps,
+        stable_ids=args.stable_ids,
+    )
+
+
+def _parse_serve_args(argv: List[str]) -> ServeArgs:
+    parser = argparse.ArgumentParser(
+        prog='main.py serve',
+        description='''
+        Compiles pages on requests coming to a unix socket
+        keeping components parsed between them
+        ''',
+    )
+    parser.add_argument(
+        '--socket',
+        metavar='PATH',
+        type=str,
+        required=True,
+        help='A unix socket to listen on',
+    )
+    _add_jobs_argument(parser)
+    _add_cache_dir_argument(parser)
+    _add_parser_argument(parser)
+    args = parser.parse_args(argv)
+
+    return ServeArgs(
+        socket=Path(args.socket).absolute(),
+        jobs=_jobs(args.jobs),
+        cache_dir=_cache_dir(args.cache_dir),
+        parser=_parser(parser, args.parser),
+    )
+
+
+def _add_minify_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--minify',
+        action='store_true',
+        default=False,
+        help='Minifies output',
+    )
+    parser.add_argument(
+        '--minify-css',
+        action='store_true',
+        default=False,
+        help='Minifies output including inline styles',
+    )
+    parser.add_argument(
+        '--minify-js',
+        action='store_true',
+        default=False,
+        help='Minifies output including inline scripts',
+    )
+    parser.add_argument(
+        '--keep-head-tags',
+        action='store_true',
+        default=False,
+        help='Keeps <html> and <head> opening tags when minifying',
+    )
+
+
+def _need_minify(args: argparse.Namespace) -> bool:
+    return args.minify or args.minify_css or args.minify_js
+
+
+def _minify_options(args: argparse.Namespace) -> MinifyOptions:
+    return MinifyOptions(
+        css=args.minify_css,
+        js=args.minify_js,
+        keep_head_tags=args.keep_head_tags,
+    )
+
+
+def _add_jobs_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--jobs',
+        metavar='N',
+        type=int,
+        action='store',
+        nargs='?',
+        default=1,
+        help='''
+        Compiles pages in N processes.
+        Default is 1, without N all cores are used
+        ''',
+    )
+
+
+def _jobs(arg: int | None) -> int:
+    return arg or os.cpu_count() or 1
+
+
+def _add_cache_dir_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--cache-dir',
+        metavar='DIR',
+        action='store',
+        nargs='?',
+        default=False,
+        help=f'''
+        Keeps parsed components in [DIR] between runs.
+        Default is {DEFAULT_CACHE_DIR}
+        ''',
+    )
+
+
+def _cache_dir(arg: str | None | bool) -> Optional[Path]:
+    if arg is False:
+        return None
+    elif arg is None:
+        return DEFAULT_CACHE_DIR.absolute()
+    else:
+        return Path(cast(str, arg)).absolute()
+
+
+def _add_parser_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--parser',
+        metavar='NAME',
+        choices=list(PARSERS.keys()),
+        default=DEFAULT_PARSER,
+        help=f'''
+        HTML parser to use: {', '.join(PARSERS.keys())}.
+        lxml is faster but has to be installed separately.
+        Default is {DEFAULT_PARSER}
+        ''',
+    )
+
+
+def _parser(parser: argparse.ArgumentParser, backend: str) -> str:
+    if not is_parser_available(backend):
+        parser.error(f"parser '{backend}' is not installed")
+    return backend
+
+
+def _add_profiling_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        default=False,
+        help='''
+        Prints time spent in every compilation phase and component,
+        and cache hits to stderr
+        ''',
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='FILE',
+        type=str,
+        default=None,
+        help='''
+        Writes the same in Chrome trace format (JSON) to FILE.
+        It can be opened in chrome://tracing or Perfetto
+        ''',
+    )
+
+
+def _profile(arg: str | None) -> Optional[Path]:
+    if arg is None:
+        return None
+    return Path(arg).absolute()
+
+
+def _add_stable_ids_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--stable-ids',
+        action='store_true',
+        default=False,
+        help='''
+        Derives unique ids from where components are used instead of
+        numbering them, so editing a part of a page doesn't change ids
+        in the rest of it
+        ''',
+    )
+
+
+def _add_print_deps_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--print-deps',
+        metavar='FORMAT',
+        choices=['json', 'dot'],
+        nargs='?',
+        const='json',
+        default=None,
+        help='''
+        Prints files imported by pages, directly or not, as json or dot
+        (Graphviz) instead of compiling them. Default is json
+        ''',
     )
@@ -0,0 +1,425 @@
+from pathlib import Path
+from collections import deque
+from typing import Deque, Dict, TextIO, Tuple, cast
+from compiller import (
+    DEFAULT_PARSER,
+    Assets,
+    Bundle,
+    process_file,
+    build_site,
+    find_pages,
+    import_graph,
+    output_path,
+    HtmlpException,
+    IncrementalBuild,
+    MANIFEST_NAME,
+    Minified,
+    Minifier,
+    Outputs,
+    PageResult,
+    Profiler,
+    stream_file,
+)
+from compiller.profiler import span
+import json
+import sys
+from args import Args, BuildArgs, ServeArgs
+
+
+def main(args: Args | BuildArgs | ServeArgs) -> None:
+    if isinstance(args, ServeArgs):
+        run_server(args)
+    elif args.print_deps is not None:
+        if not print_deps(args, args.print_deps):
+            exit(1)
+    elif isinstance(args, BuildArgs):
+        if args.watch:
+            run_build_with_watch(args)
+        elif not run_build(args):
+            exit(1)
+    elif args.watch_dir is not None:
+        run_with_watch(args)
+    else:
+        report = ProfileReport(args.timings, args.profile)
+        try:
+            run_once(
+                args.output,
+                args.input,
+                args.include_dir,
+                _minifier(args),
+                args.cache_dir,
+                args.parser,
+                report.profiler,
+                args.stable_ids,
+            )
+        except KeyboardInterrupt:
+            return
+        except HtmlpException:
+            exit(1)
+        finally:
+            report.write()
+
+
+# Collects profiles of everything built since the last report
+class ProfileReport:
+    profiler: Profiler | None
+    _timings: bool
+    _trace: Path | None
+
+    def __init__(self, timings: bool, trace: Path | None) -> None:
+        self._timings = timings
+        self._trace = trace
+        self.profiler = self._new_profiler()
+
+    def add(self, page: PageResult) -> None:
+        if self.profiler is not None and page.profile is not None:
+            self.profiler.merge(page.profile)
+
+    def write(self) -> None:
+        if self.profiler is None:
+            return
+        if self._timings:
+            print(self.profiler.summary(), file=sys.stderr)
+        if self._trace is not None:
+            with open(self._trace, 'w') as file:
+                json.dump(self.profiler.trace(), file)
+        self.profiler = self._new_profiler()
+
+    def _new_profiler(self) -> Profiler | None:
+        if self._timings or self._trace is not None:
+            return Profiler()
+        return None
+
+
+# Watching and serving pull in their own dependencies,
+# so they are imported only when used
+def run_server(args: ServeArgs) -> None:
+    import asyncio
+    from server import SocketInUse, serve
+    try:
+        asyncio.run(serve(args.socket, args.jobs, args.cache_dir, args.parser))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        return
+    except SocketInUse as e:
+        print(str(e),  file=sys.stderr)
+        exit(1)
+
+
+def print_deps(args: Args | BuildArgs, format: str) -> bool:
+    if isinstance(args, BuildArgs):
+        pages = find_pages(args.src_dir)
+    else:
+        pages = [args.input]
+    try:
+        graph = import_graph(
+            pages, args.include_dir, args.cache_dir, args.parser
+        )
+    except HtmlpException as e:
+        print(str(e),  file=sys.stderr)
+        return False
+    print(graph.to_dot() if format == 'dot' else graph.to_json())
+    return True
+
+
+def _minifier(args: Args | BuildArgs) -> Minifier | None:
+    if not args.need_minify:
+        return None
+    return Minifier(args.minify_options, args.cache_dir)
+
+
+# `output` is None for stdout
+def run_once(
+    output: Path | None,
+    input: Path,
+    include_dir: Path,
+    minifier: Minifier | None,
+    cache_dir: Path | None = None,
+    parser: str = DEFAULT_PARSER,
+    profiler: Profiler | None = None,
+    stable_ids: bool = False,
+) -> None:
+    try:
+        # minify_html can't work on chunks, and stdout can't be taken back
+        # if rendering fails halfway, so then the page is built whole.
+        # A temporary file of an output file is dropped on errors instead
+        if minifier is not None or output is None:
+            result = process_file(
+                input, include_dir, cache_dir, parser, profiler, stable_ids
+            )
+            write_output(output, result, minifier, Outputs(), profiler)
+        else:
+            Outputs().stream(output, lambda write: stream_file(
+                input, include_dir, write, cache_dir, parser, profiler,
+                stable_ids,
+            ))
+    except HtmlpException as e:
+        print(str(e),  file=sys.stderr)
+        raise e
+
+
+def write_output(
+    output: Path | None,
+    result: str,
+    minifier: Minifier | None,
+    outputs: Outputs,
+    profiler: Profiler | None = None,
+) -> None:
+    if minifier is not None:
+        result = minifier.minify(result, profiler)
+    with span(profiler, 'write'):
+        if output is not None:
+            outputs.write(output, result)
+            return
+        rewind_output(sys.stdout)
+        sys.stdout.write(result)
+        finish_output(sys.stdout)
+
+
+# Stdout redirected to a file is overwritten on every rebuild in watch mode
+def rewind_output(out: TextIO) -> None:
+    if out.seekable():
+        out.seek(0)
+
+
+def finish_output(out: TextIO) -> None:
+    out.flush()
+    if out.seekable():
+        try:
+            out.truncate()
+        except OSError:
+            # Seekable devices like /dev/null can't be truncated
+            pass
+
+
+# Styles and scripts of every built page written to shared files
+class SiteBundle:
+    bundle: Bundle
+    _css: Path
+    _js: Path
+    _minify: bool
+    _pages: Dict[Path, Assets]
+
+    def __init__(self, args: BuildArgs, name: str) -> None:
+        self.bundle = Bundle(
+            args.src_dir / (name + '.css'),
+            args.src_dir / (name + '.js'),
+        )
+        self._css = args.out_dir / (name + '.css')
+        self._js = args.out_dir / (name + '.js')
+        self._minify = args.need_minify
+        self._pages = dict()
+
+    def add(self, page: PageResult) -> None:
+        if page.assets is not None:
+            self._pages[page.path] = page.assets
+
+    def write(
+        self,
+        outputs: Outputs,
+        profiler: Profiler | None = None,
+    ) -> None:
+        assets = Assets()
+        for page in sorted(self._pages):
+            # Deleted pages are forgotten in watch mode
+            if page.exists():
+                assets.update(self._pages[page])
+        with span(profiler, 'bundle'):
+            outputs.write(self._css, assets.css(self._minify))
+            outputs.write(self._js, assets.js())
+
+
+def _site_bundle(args: BuildArgs) -> SiteBundle | None:
+    if args.bundle is None:
+        return None
+    return SiteBundle(args, args.bundle)
+
+
+def run_build(args: BuildArgs) -> bool:
+    report = ProfileReport(args.timings, args.profile)
+    outputs = _site_outputs(args)
+    writer = PageWriter(args, outputs, _minifier(args), report)
+    bundle = _site_bundle(args)
+    pages = find_pages(args.src_dir)
+    results = build_site(
+        pages,
+        args.include_dir,
+        args.jobs,
+        args.cache_dir,
+        args.parser,
+        report.profiler is not None,
+        None if bundle is None else bundle.bundle,
+        args.stable_ids,
+    )
+    for page in results:
+        report.add(page)
+        if bundle is not None:
+            bundle.add(page)
+        writer.add(page)
+    writer.finish()
+    if bundle is not None:
+        bundle.write(outputs, report.profiler)
+    report_outputs(outputs)
+    report.write()
+    return writer.succeed
+
+
+def _site_outputs(args: BuildArgs) -> Outputs:
+    return Outputs(args.out_dir / MANIFEST_NAME)
+
+
+def report_outputs(outputs: Outputs) -> None:
+    outputs.save()
+    print(f"{outputs.written} files written, {outputs.unchanged} unchanged")
+    outputs.reset_counters()
+
+
+# Pages are minified in background threads while next ones are compiled.
+# They are written (and errors reported) in the order they were added
+class PageWriter:
+    succeed: bool
+    _args: BuildArgs
+    _outputs: Outputs
+    _minifier: Minifier | None
+    _report: ProfileReport
+    _pending: Deque[Tuple[PageResult, Minified | None]]
+
+    def __init__(
+        self,
+        args: BuildArgs,
+        outputs: Outputs,
+        minifier: Minifier | None,
+        report: ProfileReport,
+    ) -> None:
+        self.succeed = True
+        self._args = args
+        self._outputs = outputs
+        self._minifier = minifier
+        self._report = report
+        self._pending = deque()
+
+    def add(self, page: PageResult) -> None:
+        minified = None
+        if page.error is None and self._minifier is not None:
+            minified = self._minifier.submit(
+                cast(str, page.html),
+                self._report.profiler,
+            )
+        self._pending.append((page, minified))
+        self._write(wait=False)
+
+    def finish(self) -> None:
+        self._write(wait=True)
+
+    def _write(self, wait: bool) -> None:
+        while len(self._pending) > 0:
+            [page, minified] = self._pending[0]
+            if not wait and minified is not None and not minified.done():
+                return
+            self._pending.popleft()
+            if page.error is not None:
+                print(str(page.error),  file=sys.stderr)
+                self.succeed = False
+                continue
+            if minified is None:
+                html = cast(str, page.html)
+            else:
+                html = minified.result()
+            path = output_path(
+                page.path,
+                self._args.src_dir,
+                self._args.out_dir,
+            )
+            with span(self._report.profiler, 'write'):
+                self._outputs.write(path, html)
+
+
+def run_with_watch(args: Args) -> None:
+    from watcher import watch
+    build = IncrementalBuild(
+        [args.input],
+        args.include_dir,
+        cache_dir=args.cache_dir,
+        parser=args.parser,
+        profile=args.timings or args.profile is not None,
+        stable_ids=args.stable_ids,
+    )
+    report = ProfileReport(args.timings, args.profile)
+    outputs = Outputs()
+    minifier = _minifier(args)
+
+    def write_page(page: PageResult) -> None:
+        report.add(page)
+        if page.error is not None:
+            print(str(page.error),  file=sys.stderr)
+        else:
+            write_output(
+                args.output,
+                cast(str, page.html),
+                minifier,
+                outputs,
+                report.profiler,
+            )
+
+    def finish() -> None:
+        if args.output is not None:
+            report_outputs(outputs)
+        report.write()
+
+    for page in build.build_all():
+        write_page(page)
+    finish()
+    ignored = []
+    if args.output is not None:
+        ignored.append(args.output)
+    watch(
+        [cast(Path, args.watch_dir)],
+        ignored,
+        build.rebuild,
+        write_page,
+        finish,
+    )
+
+
+def run_build_with_watch(args: BuildArgs) -> None:
+    from watcher import watch
+    bundle = _site_bundle(args)
+    build = IncrementalBuild(
+        find_pages(args.src_dir),
+        args.include_dir,
+        src_dir=args.src_dir,
+        cache_dir=args.cache_dir,
+        parser=args.parser,
+        profile=args.timings or args.profile is not None,
+        bundle=None if bundle is None else bundle.bundle,
+        stable_ids=args.stable_ids,
+    )
+    report = ProfileReport(args.timings, args.profile)
+    outputs = _site_outputs(args)
+    writer = PageWriter(args, outputs, _minifier(args), report)
+
+    def write(page: PageResult) -> None:
+        report.add(page)
+        if bundle is not None:
+            bundle.add(page)
+        writer.add(page)
+
+    def finish() -> None:
+        writer.finish()
+        if bundle is not None:
+            bundle.write(outputs, report.profiler)
+        report_outputs(outputs)
+        report.write()
+
+    for page in build.build_all():
+        write(page)
+    finish()
+    dirs = [args.src_dir]
+    if not args.include_dir.is_relative_to(args.src_dir):
+        dirs.append(args.include_dir)
+    watch(
+        dirs,
+        [args.out_dir],
+        build.rebuild,
+        write,
+        finish,
+    )
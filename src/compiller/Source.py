@@ -1,19 +1,28 @@
 from pathlib import Path
-from bs4 import BeautifulSoup, Tag
+from typing import TYPE_CHECKING
+from .parser import DEFAULT_PARSER, parse
+if TYPE_CHECKING:
+    from bs4 import Tag
 
 
 class Source:
     path: Path
-    tag: Tag
+    tag: 'Tag'
 
-    def __init__(self, path: Path, tag: Tag | None = None) -> None:
+    def __init__(
+        self,
+        path: Path,
+        tag: 'Tag | None' = None,
+        parser: str = DEFAULT_PARSER,
+    ) -> None:
         self.path = path
         if tag is not None:
             self.tag = tag
             return
-        with open(path) as file:
-            self.tag = BeautifulSoup(
-                file.read(),
-                'html.parser',
-                multi_valued_attributes=None,
-            )
+        self.tag = parse(read_source(path), parser)
+
+
+# Sources are UTF-8 whatever the locale is
+def read_source(path: Path) -> str:
+    with open(path, encoding='utf-8') as file:
+        return file.read()
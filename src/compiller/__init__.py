@@ -1,24 +1,113 @@
-from pathlib import Path
-from .component.imports import (
-    parse_imports_and_remove_them,
-    clear_imports_cache,
-)
-from .component.gen import substitute_components
-from .component.uniques import restart_uniques_generator
-from .exceptions import HtmlpException
+from typing import TYPE_CHECKING
+from .version import VERSION
+# The class is bound eagerly: importing any submodule would otherwise
+# set the package attribute to the Source module of the same name
 from .Source import Source
+import importlib
+if TYPE_CHECKING:
+    from .compiler import Compiler
+    from .component.assets import Assets, Bundle
+    from .component.cache import DEFAULT_CACHE_DIR
+    from .component.gen import Template
+    from .component.graph import ImportGraph
+    from .exceptions import HtmlpException
+    from .minify import Minified, Minifier, MinifyOptions
+    from .output import MANIFEST_NAME, Outputs
+    from .parser import DEFAULT_PARSER, PARSERS, is_parser_available
+    from .process import (
+        Page,
+        import_graph,
+        process_file,
+        process_page,
+        process_page_source,
+        process_source,
+        stream_file,
+    )
+    from .site import (
+        IncrementalBuild,
+        PageResult,
+        build_site,
+        find_pages,
+        output_path,
+    )
+    from .profiler import Profiler
 
 
-def process_file(path: Path, include_dir: Path) -> str:
-    clear_imports_cache()
-    restart_uniques_generator()
-    src = Source(path)
-    imports = parse_imports_and_remove_them(src, include_dir)
-    substitute_components(imports, src)
-    return str(src.tag)
+__version__ = VERSION
+
+
+# Submodules are imported on the first access to their names,
+# so using a part of the package doesn't load the rest of it
+_EXPORTS = {
+    'Assets': '.component.assets',
+    'Bundle': '.component.assets',
+    'Compiler': '.compiler',
+    'DEFAULT_CACHE_DIR': '.component.cache',
+    'DEFAULT_PARSER': '.parser',
+    'HtmlpException': '.exceptions',
+    'ImportGraph': '.component.graph',
+    'IncrementalBuild': '.site',
+    'MANIFEST_NAME': '.output',
+    'Minified': '.minify',
+    'Minifier': '.minify',
+    'MinifyOptions': '.minify',
+    'Outputs': '.output',
+    'PARSERS': '.parser',
+    'Page': '.process',
+    'PageResult': '.site',
+    'Profiler': '.profiler',
+    'Template': '.component.gen',
+    'build_site': '.site',
+    'find_pages': '.site',
+    'import_graph': '.process',
+    'is_parser_available': '.parser',
+    'output_path': '.site',
+    'process_file': '.process',
+    'process_page': '.process',
+    'process_page_source': '.process',
+    'process_source': '.process',
+    'stream_file': '.process',
+}
+
+
+def __getattr__(name: str) -> object:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
 
 __all__ = [
+    'Assets',
+    'Bundle',
+    'Compiler',
+    'DEFAULT_CACHE_DIR',
+    'DEFAULT_PARSER',
     'HtmlpException',
-    'process_file'
+    'ImportGraph',
+    'IncrementalBuild',
+    'MANIFEST_NAME',
+    'Minified',
+    'Minifier',
+    'MinifyOptions',
+    'Outputs',
+    'PARSERS',
+    'Page',
+    'PageResult',
+    'Profiler',
+    'Source',
+    'Template',
+    'VERSION',
+    'build_site',
+    'find_pages',
+    'import_graph',
+    'is_parser_available',
+    'output_path',
+    'process_file',
+    'process_page',
+    'process_page_source',
+    'process_source',
+    'stream_file',
 ]
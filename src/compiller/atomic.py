@@ -0,0 +1,56 @@
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO, Type
+import itertools
+import os
+
+
+# Temporary names are unique per process and per write, so threads
+# and processes writing the same file at once don't share one.
+# mkstemp isn't used as it creates files readable only by the owner
+_counter = itertools.count()
+
+
+# Writes a temporary file next to `path`, which replaces it at the end
+# of the `with` block. If the block raises or discards it, `path`
+# is left as it was
+class AtomicWrite:
+    path: Path
+    file: BinaryIO
+    _tmp: Path
+    _is_done: bool
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._tmp = path.with_name(
+            f".{path.name}.{os.getpid()}.{next(_counter)}.tmp"
+        )
+        self.file = open(self._tmp, 'xb')
+        self._is_done = False
+
+    def discard(self) -> None:
+        self.file.close()
+        self._tmp.unlink(missing_ok=True)
+        self._is_done = True
+
+    def __enter__(self) -> 'AtomicWrite':
+        return self
+
+    def __exit__(
+        self,
+        type: Type[BaseException] | None,
+        value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if self._is_done:
+            return
+        if value is not None:
+            self.discard()
+            return
+        try:
+            self.file.close()
+            os.replace(self._tmp, self.path)
+        except BaseException:
+            self.discard()
+            raise
+        self._is_done = True
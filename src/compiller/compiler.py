@@ -0,0 +1,160 @@
+from pathlib import Path
+from threading import RLock
+from typing import List, Set, Tuple
+from .component.assets import Assets
+from .component.gen import Template, Write, render_page
+from .component.imports import (
+    ComponentDefinition,
+    Imports,
+    ImportsCache,
+    IncludeDirs,
+    compile_component,
+    dependencies,
+    is_component,
+    load_component,
+    parse_args_def,
+    parse_imports_and_remove_them,
+)
+from .component.plan import compile_plan
+from .component.uniques import UniquesGenerator
+from .parser import DEFAULT_PARSER, parse
+from .process import Page
+from .Source import Source
+
+
+# Compiles pages and html snippets in process. Components stay parsed
+# between calls, so once they are loaded nothing is read from disk
+# to compile a string. Every compilation numbers unique ids from the start.
+# Calls from several threads are safe: imports are resolved one at a time,
+# rendering doesn't touch shared state
+class Compiler:
+    include_dirs: List[Path]
+    _cache: ImportsCache
+    _lock: RLock
+
+    def __init__(
+        self,
+        include_dirs: IncludeDirs,
+        cache_dir: Path | None = None,
+        parser: str = DEFAULT_PARSER,
+        stable_ids: bool = False,
+    ) -> None:
+        if isinstance(include_dirs, Path):
+            include_dirs = [include_dirs]
+        self.include_dirs = [dir.absolute() for dir in include_dirs]
+        self._cache = ImportsCache(cache_dir, parser, stable_ids=stable_ids)
+        self._lock = RLock()
+
+    def compile_file(self, path: Path) -> str:
+        src = Source(path, parser=self._cache.parser)
+        return self.compile_source(src).html
+
+    # `path` is only shown in error messages
+    def compile_string(
+        self,
+        source: str,
+        path: Path = Path('<string>'),
+    ) -> str:
+        src = Source(path, parse(source, self._cache.parser))
+        return self.compile_source(src).html
+
+    # The source is changed: imports are removed from it
+    def compile_source(self, src: Source) -> Page:
+        chunks: List[str] = []
+        [imports, assets] = self._render(src, chunks.append)
+        return Page(
+            ''.join(chunks),
+            frozenset(dependencies(imports)),
+            assets,
+        )
+
+    # Styles and scripts of used components are inlined into the page
+    def render(self, src: Source, write: Write) -> Imports:
+        return self._render(src, write)[0]
+
+    def _render(self, src: Source, write: Write) -> Tuple[Imports, Assets]:
+        with self._lock:
+            imports = parse_imports_and_remove_them(
+                src,
+                self.include_dirs,
+                self._cache,
+            )
+        assets = render_page(
+            imports,
+            src,
+            UniquesGenerator(self._cache.stable_ids),
+            write,
+        )
+        return imports, assets
+
+    # Components are rendered with values of their arguments.
+    # Pages are compiled with `args` declared as in <template args="...">,
+    # so $arg and !id placeholders in them work like in components
+    def template_file(self, path: Path, args: str = '') -> Template:
+        src = Source(path, parser=self._cache.parser)
+        if is_component(src):
+            with self._lock:
+                definition = load_component(
+                    path.absolute(),
+                    self.include_dirs,
+                    self._cache,
+                )
+            return self._component_template(definition)
+        return self._page_template(src, args)
+
+    def template_string(
+        self,
+        source: str,
+        args: str = '',
+        path: Path = Path('<string>'),
+    ) -> Template:
+        src = Source(path, parse(source, self._cache.parser))
+        if is_component(src):
+            with self._lock:
+                definition = compile_component(
+                    src,
+                    self.include_dirs,
+                    self._cache,
+                )
+            return self._component_template(definition)
+        return self._page_template(src, args)
+
+    def _page_template(self, src: Source, args: str) -> Template:
+        args_def = parse_args_def(args, src.path)
+        with self._lock:
+            imports = parse_imports_and_remove_them(
+                src,
+                self.include_dirs,
+                self._cache,
+            )
+        plan = compile_plan(
+            src.tag.contents,
+            set(imports.keys()),
+            set(map(lambda d: d.name, args_def)),
+        )
+        return Template(
+            src.path,
+            imports,
+            plan,
+            args_def,
+            self._cache.stable_ids,
+        )
+
+    def _component_template(self, definition: ComponentDefinition) -> Template:
+        return Template(
+            definition.file,
+            definition.imports,
+            definition.plan,
+            definition.args_def,
+            self._cache.stable_ids,
+            definition,
+        )
+
+    # Call when files change. Components importing them are dropped too
+    def invalidate(self, path: Path) -> Set[Path]:
+        with self._lock:
+            return self._cache.invalidate(path.absolute())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
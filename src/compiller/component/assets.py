@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Set, Tuple
+from .imports import ComponentDefinition
+from .plan import AssetsSlot, ComponentCall, Plan, start_tag
+import os
+
+
+# Styles and scripts of used components, each of them taken once
+# no matter how many times the component is used
+class Assets:
+    # file -> stylesheet, in order of the first usage
+    styles: Dict[Path, str]
+    # file -> script, in order of the first usage
+    scripts: Dict[Path, str]
+
+    def __init__(self) -> None:
+        self.styles = dict()
+        self.scripts = dict()
+
+    def add(self, definition: ComponentDefinition) -> None:
+        if definition.stylesheet.strip() != '':
+            self.styles[definition.file] = definition.stylesheet
+        if definition.script.strip() != '':
+            self.scripts[definition.file] = definition.script
+
+    def update(self, other: 'Assets') -> None:
+        self.styles.update(other.styles)
+        self.scripts.update(other.scripts)
+
+    def css(self, minify: bool = False) -> str:
+        css = '\n'.join(self.styles.values())
+        if minify:
+            from rcssmin import cssmin  # type: ignore
+            return cssmin(css)
+        return css
+
+    # Semicolons keep the end of one script from running into the next one
+    def js(self) -> str:
+        return ';\n'.join(self.scripts.values())
+
+    # tag name -> html to put before its end tag
+    def html(self, page: Path, bundle: 'Bundle | None') -> Dict[str, str]:
+        if bundle is not None:
+            return {'head': bundle.links(page, self), 'body': ''}
+        head = ''
+        body = ''
+        if len(self.styles) > 0:
+            head = '<style>' + self.css() + '</style>'
+        if len(self.scripts) > 0:
+            # Inline scripts can't be deferred, so they go after the content
+            body = '<script>' + self.js() + '</script>'
+        return {'head': head, 'body': body}
+
+
+# Styles and scripts written to files shared by pages instead of being
+# put into every one of them. Paths are where the files would be among
+# the sources, so links from pages work for compiled pages as well
+@dataclass(frozen=True)
+class Bundle:
+    css: Path
+    js: Path
+
+    def links(self, page: Path, assets: Assets) -> str:
+        html = ''
+        if len(assets.styles) > 0:
+            html += start_tag(
+                'link',
+                [('href', _href(self.css, page)), ('rel', 'stylesheet')],
+                True,
+            )
+        if len(assets.scripts) > 0:
+            html += start_tag(
+                'script',
+                [('defer', ''), ('src', _href(self.js, page))],
+                False,
+            )
+            html += '</script>'
+        return html
+
+
+def _href(path: Path, page: Path) -> str:
+    return Path(os.path.relpath(path, page.parent)).as_posix()
+
+
+# Assets of every component used by the plan, directly or not,
+# and tags of reachable AssetsSlot nodes
+def collect_assets(
+    plan: Plan,
+    imports: Mapping[str, ComponentDefinition],
+) -> Tuple[Assets, Set[str]]:
+    assets = Assets()
+    slots: Set[str] = set()
+    _collect(plan, imports, assets, slots, set())
+    return assets, slots
+
+
+def _collect(
+    plan: Plan,
+    imports: Mapping[str, ComponentDefinition],
+    assets: Assets,
+    slots: Set[str],
+    seen: Set[Path],
+) -> None:
+    for node in plan:
+        if isinstance(node, AssetsSlot):
+            slots.add(node.tag)
+        elif isinstance(node, ComponentCall):
+            definition = imports[node.alias]
+            if definition.file not in seen:
+                seen.add(definition.file)
+                assets.add(definition)
+                if definition.plan is not None:
+                    _collect(
+                        definition.plan,
+                        definition.imports,
+                        assets,
+                        slots,
+                        seen,
+                    )
+            # Children are rendered in the caller's file
+            _collect(node.children, imports, assets, slots, seen)
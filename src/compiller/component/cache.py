@@ -0,0 +1,50 @@
+import hashlib
+import pickle
+from pathlib import Path
+from typing import Any
+from ..atomic import AtomicWrite
+from ..version import VERSION
+
+
+DEFAULT_CACHE_DIR = Path('.htmlp-cache')
+# Bump when pickled structures change
+_FORMAT = 6
+
+
+class DiskCache:
+    _directory: Path
+    _parser: str
+
+    def __init__(self, directory: Path, parser: str) -> None:
+        self._directory = directory
+        self._parser = parser
+
+    # Entries depend only on the file content and the style prefix
+    # (and htmlp version and parser), so files copied to other
+    # directories hit the same entry
+    def key(self, content: str, style_prefix: str) -> str:
+        data = '\0'.join(
+            [VERSION, str(_FORMAT), self._parser, style_prefix, content]
+        )
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def load(self, key: str) -> Any | None:
+        try:
+            with open(self._entry_path(key), 'rb') as file:
+                return pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # Broken entry is the same as missing one
+            return None
+
+    def store(self, key: str, entry: Any) -> None:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        path = self._entry_path(key)
+        with AtomicWrite(path) as tmp:
+            try:
+                pickle.dump(entry, tmp.file)
+            except RecursionError:
+                # Too deeply nested component usages. It's simply not cached
+                tmp.discard()
+
+    def _entry_path(self, key: str) -> Path:
+        return self._directory / (key + '.pickle')
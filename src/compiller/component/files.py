@@ -0,0 +1,67 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Set
+from ..Source import read_source
+
+
+# Reads component files. Files imported by the same component are read
+# by a pool of threads at once, which hides the latency of slow
+# (e.g. network) file systems. Existing files are remembered,
+# so they are not checked again until they are invalidated.
+# Missing ones are not: they fail the compilation anyway
+class SourceFiles:
+    _pool: ThreadPoolExecutor | None
+    _pending: Dict[Path, Future[str]]
+    _existing: Set[Path]
+
+    def __init__(self) -> None:
+        self._pool = None
+        self._pending = dict()
+        self._existing = set()
+
+    # There is nothing to read in parallel with a single file
+    def prefetch(self, paths: Iterable[Path]) -> None:
+        paths = [
+            path for path in dict.fromkeys(paths)
+            if path not in self._pending
+        ]
+        if len(paths) < 2:
+            return
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(thread_name_prefix='htmlp-read')
+        for path in paths:
+            self._pending[path] = self._pool.submit(read_source, path)
+
+    # Raises the same errors reading the file would
+    def read(self, path: Path) -> str:
+        future = self._pending.pop(path, None)
+        if future is None:
+            return read_source(path)
+        return future.result()
+
+    def exists(self, path: Path) -> bool:
+        if path in self._existing:
+            return True
+        future = self._pending.get(path)
+        if future is None:
+            exists = path.exists()
+        else:
+            exists = not isinstance(future.exception(), FileNotFoundError)
+        if exists:
+            self._existing.add(path)
+        return exists
+
+    # Prefetched files which ended up not being read
+    def discard(self, paths: Iterable[Path]) -> None:
+        for path in paths:
+            future = self._pending.pop(path, None)
+            if future is not None:
+                future.cancel()
+
+    def invalidate(self, path: Path) -> None:
+        self._existing.discard(path)
+        self.discard([path])
+
+    def clear(self) -> None:
+        self._existing.clear()
+        self.discard(list(self._pending))
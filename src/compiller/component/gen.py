@@ -1,15 +1,29 @@
-from copy import deepcopy
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from functools import cached_property
 from pathlib import Path
-import re
-from typing import cast
-from bs4 import PageElement, Tag
+from typing import Callable, Dict, List, Mapping, Set, Tuple, TypeAlias, cast
 
 from compiller.Source import Source
-from .uniques import UniquesPerComponent
+from .assets import Assets, Bundle, collect_assets
+from .uniques import UniquesGenerator, UniquesPerComponent
 from .imports import ComponentArgDefinition, ComponentDefinition, Imports
+from .plan import (
+    ArgNamedAttr,
+    AssetsSlot,
+    Attr,
+    ChildrenSlot,
+    ComponentCall,
+    Plan,
+    StartTag,
+    StaticAttr,
+    Text,
+    UniqueRef,
+    ValuePart,
+    compile_plan,
+    start_tag,
+)
 from .. import exceptions as ex
+from ..profiler import Profiler
 
 
 @dataclass(init=False, unsafe_hash=True)
@@ -39,125 +53,366 @@ class ComponentArg:
     def name(self) -> str:
         return self._def.name
 
-    @cached_property
-    def placeholder(self) -> str:
-        return '$' + self.name
 
-    @cached_property
-    def _unique_placeholder(self) -> str:
-        return '!' + self.name
+Write: TypeAlias = Callable[[str], object]
+
+
+# Rendered html kept as references to its pieces, so html rendered once
+# (children of a usage, an instance of a component) is never copied
+# into the html around it. Fragments with equal pieces are equal,
+# so they are keys of rendered instances as strings would be
+class _Fragment:
+    __slots__ = ('pieces', '_hash')
+    pieces: Tuple['str | _Fragment', ...]
+    _hash: int
+
+    def __init__(self, pieces: Tuple['str | _Fragment', ...]) -> None:
+        self.pieces = pieces
+        self._hash = hash(pieces)
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, _Fragment) or self._hash != other._hash:
+            return False
+        return self.pieces == other.pieces
+
+    def write_to(self, write: Write) -> None:
+        # Fragments written into a fragment are referenced, not walked
+        if isinstance(write, _FragmentWriter):
+            write.pieces.append(self)
+            return
+        for piece in self.pieces:
+            if isinstance(piece, str):
+                write(piece)
+            else:
+                piece.write_to(write)
+
+
+class _FragmentWriter:
+    pieces: List['str | _Fragment']
+
+    def __init__(self) -> None:
+        self.pieces = []
+
+    def __call__(self, html: str) -> None:
+        self.pieces.append(html)
 
-    def substitute_in(self, string: str) -> str:
-        if self.value is None:
-            return string.replace(self.placeholder, '')
+    def fragment(self) -> _Fragment:
+        return _Fragment(tuple(self.pieces))
+
+
+# Everything needed to render nodes written in some file
+@dataclass(frozen=True)
+class Frame:
+    file: Path
+    imports: Mapping[str, ComponentDefinition]
+    uniques_generator: UniquesGenerator
+    uniques: UniquesPerComponent
+    args: Dict[str, str | None] = field(default_factory=dict)
+    # Renders children of the component usage in the caller's frame
+    children: Callable[[Write], None] | None = None
+    profiler: Profiler | None = None
+    # Shared by all frames of the page, slots take their html out of it,
+    # so it's written once even if the slot is in a reused component
+    assets: Dict[str, str] = field(default_factory=dict)
+    # Rendered html of components sharing instances, shared by all frames
+    instances: Dict[Tuple, _Fragment] = field(default_factory=dict)
+    # alias -> components with it rendered in the frame so far.
+    # Stable unique ids of an instance depend on its position among them
+    calls: Dict[str, int] = field(default_factory=dict)
+
+
+# The page is compiled the same way as templates are,
+# so it's serialized straight to `write` without changing the soup.
+# Styles and scripts of used components are inlined unless `bundle`
+# is given. Pages without <head> get styles after <html> or the doctype
+# (or at the start), pages without <body> get scripts at the end
+def render_page(
+    imports: Imports,
+    page: Source,
+    uniques: UniquesGenerator,
+    write: Write,
+    profiler: Profiler | None = None,
+    bundle: Bundle | None = None,
+) -> Assets:
+    plan = compile_plan(page.tag.contents, set(imports.keys()), None)
+    [assets, slots] = collect_assets(plan, imports)
+    frame = Frame(
+        page.path,
+        imports,
+        uniques,
+        UniquesPerComponent(uniques),
+        profiler=profiler,
+        assets=assets.html(page.path, bundle),
+    )
+    _render_with_assets(plan, frame, slots, write)
+    return assets
+
+
+# `slots` are tags of AssetsSlot nodes reachable from the plan
+def _render_with_assets(
+    plan: Plan,
+    frame: Frame,
+    slots: Set[str],
+    write: Write,
+) -> None:
+    if 'head' not in slots:
+        # Styles before the doctype would put browsers into quirks mode
+        head = frame.assets.pop('head')
+        if 'html' in slots:
+            frame.assets['html'] = head
+        elif 'doctype' in slots:
+            frame.assets['doctype'] = head
         else:
-            return string.replace(
-                self.placeholder, self.value
-            ).replace(
-                self._unique_placeholder, self.value
-            )
+            write(head)
+    render(plan, frame, write)
+    for rest in frame.assets.values():
+        write(rest)
 
 
-def substitute_components(imports: Imports, usage: Source) -> None:
-    for [alias, definition] in imports.items():
-        if usage.tag.name == alias:
-            _substitute_one(definition, usage)
-            continue
-        for tag in usage.tag.find_all(alias):
-            _substitute_one(definition, Source(usage.path, tag))
+def render(plan: Plan, frame: Frame, write: Write) -> None:
+    for node in plan:
+        if isinstance(node, Text):
+            write(node.html)
+        elif isinstance(node, StartTag):
+            write(start_tag(
+                node.name,
+                _render_attrs(node.attrs, frame).items(),
+                node.is_void,
+            ))
+        elif isinstance(node, ChildrenSlot):
+            if frame.children is not None:
+                frame.children(write)
+        elif isinstance(node, AssetsSlot):
+            write(frame.assets.pop(node.tag, ''))
+        else:
+            Component(node, frame).render(write)
 
 
-def _substitute_one(component_def: ComponentDefinition, usage: Source) -> None:
-    component = Component(component_def, usage)
-    fictitious_root = component.generate_html()
-    if fictitious_root is None:
-        usage.tag.decompose()
-        return
-    last_tag: PageElement = usage.tag
-    for tag in deepcopy(fictitious_root.children):
-        last_tag.insert_after(tag)
-        last_tag = tag
-    usage.tag.decompose()
+def _render_attrs(attrs: List[Attr], frame: Frame) -> Dict[str, str]:
+    rendered: Dict[str, str] = dict()
+    for attr in attrs:
+        if isinstance(attr, StaticAttr):
+            rendered[attr.name] = attr.value
+        elif isinstance(attr, ArgNamedAttr):
+            arg = frame.args[attr.arg_name]
+            if arg is not None:
+                rendered[attr.arg_name] = arg
+        else:
+            value = _render_attr_value(attr.parts, frame)
+            if value is not None:
+                rendered[attr.name] = value
+    return rendered
+
+
+# Returns None if the attribute is left empty by arguments
+def _render_attr_value(parts: List[ValuePart], frame: Frame) -> str | None:
+    pieces: List[str] = []
+    for part in parts:
+        if isinstance(part, str):
+            pieces.append(part)
+            continue
+        arg = frame.args.get(part.name)
+        if arg is not None:
+            pieces.append(arg)
+        elif isinstance(part, UniqueRef):
+            pieces.append(frame.uniques.get_by_id(part.name))
+    value = ''.join(pieces)
+    if value == '' or value.isspace():
+        return None
+    return value
 
 
 class Component:
-    _html: Tag
     _def: ComponentDefinition
-    _usage: Tag
-    _usage_file: Path
-    _uniques: UniquesPerComponent
+    _usage: ComponentCall
+    _caller: Frame
+    _args: Dict[str, str | None]
+
+    def __init__(self, usage: ComponentCall, caller: Frame) -> None:
+        self._def = caller.imports[usage.alias]
+        self._usage = usage
+        self._caller = caller
+        self._args = make_args(
+            usage.alias,
+            self._def.args_def,
+            _render_attrs(usage.attrs, caller),
+            caller.file,
+            usage.line,
+        )
+
+    def render(self, write: Write) -> None:
+        if self._def.plan is None:
+            return
+        if not self._def.shares_instances:
+            self._render(self._render_children, write)
+            return
+        children = None
+        if self._def.takes_children and len(self._usage.children) > 0:
+            writer = _FragmentWriter()
+            self._render_children(writer)
+            children = writer.fragment()
+        key = (self._def.file, tuple(self._args.values()), children)
+        instances = self._caller.instances
+        html = instances.get(key)
+        profiler = self._caller.profiler
+        if profiler is not None:
+            profiler.hit('instances', html is not None)
+        if html is None:
+            writer = _FragmentWriter()
+            self._render(
+                None if children is None else children.write_to,
+                writer,
+            )
+            html = writer.fragment()
+            instances[key] = html
+        html.write_to(write)
+
+    def _render(
+        self,
+        children: Callable[[Write], None] | None,
+        write: Write,
+    ) -> None:
+        caller = self._caller
+        frame = Frame(
+            self._def.file,
+            self._def.imports,
+            caller.uniques_generator,
+            UniquesPerComponent(
+                caller.uniques_generator,
+                self._instance_key(),
+            ),
+            self._args,
+            children if len(self._usage.children) > 0 else None,
+            caller.profiler,
+            caller.assets,
+            caller.instances,
+        )
+        plan = cast(Plan, self._def.plan)
+        if frame.profiler is None:
+            render(plan, frame, write)
+            return
+        with frame.profiler.span('render', self._def.file):
+            render(plan, frame, write)
+
+    def _render_children(self, write: Write) -> None:
+        render(self._usage.children, self._caller, write)
+
+    # Only needed for stable ids
+    def _instance_key(self) -> str:
+        caller = self._caller
+        if not caller.uniques_generator.stable:
+            return ''
+        alias = self._usage.alias
+        index = caller.calls.get(alias, 0)
+        caller.calls[alias] = index + 1
+        return f"{caller.uniques.key}/{alias}:{index}"
 
+
+# `file` and `line` are where the values are given
+def make_args(
+    tag_name: str,
+    args_def: List[ComponentArgDefinition],
+    values: Mapping[str, str],
+    file: Path,
+    line: int | None,
+) -> Dict[str, str | None]:
+    names = set(map(lambda d: d.name, args_def))
+    extra = set(values.keys()).difference(names)
+    if len(extra) > 0:
+        raise ex.ExtraArgs(extra, file, line)
+
+    def arg_from_def(definition: ComponentArgDefinition):
+        try:
+            return ComponentArg(
+                tag_name,
+                definition,
+                values.get(definition.name)
+            )
+        except ex.HtmlpException as e:
+            ex.add_location_context(e, file=file)
+
+    args = map(arg_from_def, args_def)
+    return dict(map(lambda arg: (arg.name, arg.value), args))
+
+
+# Page or component compiled once to be rendered many times with
+# different argument values, e.g. on every request. Imports are resolved
+# beforehand, so changed files are only seen by new templates.
+# Styles and scripts are put into the html the same way as into pages,
+# `assets` are there to bundle them instead
+class Template:
+    file: Path
+    args_def: List[ComponentArgDefinition]
+    assets: Assets
+    _imports: Mapping[str, ComponentDefinition]
+    _plan: Plan | None
+    _slots: Set[str]
+    _stable_ids: bool
+
+    # `component` is given for templates of components,
+    # its own style and script go before the ones of components it uses
     def __init__(
         self,
-        definition: ComponentDefinition,
-        usage_src: Source,
+        file: Path,
+        imports: Mapping[str, ComponentDefinition],
+        plan: Plan | None,
+        args_def: List[ComponentArgDefinition],
+        stable_ids: bool = False,
+        component: ComponentDefinition | None = None,
     ) -> None:
-        self._uniques = UniquesPerComponent()
-        self._def = definition
-        self._usage = usage_src.tag
-        self._usage_file = usage_src.path
-
-    def generate_html(self) -> Tag | None:
-        if self._def.template is None:
-            return None
-        self._html = deepcopy(self._def.template)
-        self._apply_args()
-        self._apply_uniques()
-        self._substitute_inner_components()
-        self._insert_children()
-        return self._html
-
-    def _apply_args(self) -> None:
-        values = self._usage.attrs
-        names = set(map(lambda d: d.name, self._def.args_def))
-        extra = set(values.keys()).difference(names)
-
-        def arg_from_def(definition: ComponentArgDefinition):
-            try:
-                return ComponentArg(
-                    self._usage.name,
-                    definition,
-                    self._usage.attrs.get(definition.name)
-                )
-            except ex.HtmlpException as e:
-                ex.add_location_context(e, file=self._usage_file)
-
-        if len(extra) > 0:
-            raise ex.ExtraArgs(extra, self._usage_file, self._usage.sourceline)
-        args = set(map(arg_from_def, self._def.args_def))
-        for tag in self._html.find_all():
-            for [name, value] in tag.attrs.copy().items():
-                for arg in list(args):
-                    if arg.placeholder == name:
-                        del tag[name]
-                        if arg.value is not None:
-                            tag[arg.name] = arg.value
-                        break
-                    value = arg.substitute_in(value)
-                    if value.isspace() or value == '':
-                        del tag[name]
-                        break
-                    else:
-                        tag[name] = value
-
-    def _substitute_inner_components(self) -> None:
-        imports = cast(Imports, self._def.imports)
-        substitute_components(imports, Source(self._def.file, self._html))
-
-    def _apply_uniques(self) -> None:
-        unique_id_pattern = re.compile('![A-z]+\\s|![A-z_-]+$')
-        for tag in self._html.find_all():
-            for [name, value] in tag.attrs.copy().items():
-                for id in unique_id_pattern.findall(value):
-                    value = value.replace(id, self._uniques.get_by_id(id))
-                tag[name] = value
-
-    def _insert_children(self) -> None:
-        children = self._usage.children
-        placeholder_regex = re.compile("\\s*\\$children\\s*")
-        for tag in self._html.find_all(string=placeholder_regex):
-            last_child = tag
-            for child in deepcopy(children):
-                last_child.insert_after(child)
-                last_child = child
-            tag.extract()
+        self.file = file
+        self.args_def = args_def
+        self.assets = Assets()
+        self._imports = imports
+        self._plan = plan
+        self._slots = set()
+        self._stable_ids = stable_ids
+        if plan is None:
+            return
+        if component is not None:
+            self.assets.add(component)
+        [used, self._slots] = collect_assets(plan, imports)
+        self.assets.update(used)
+
+    # `children` is html put in place of $children
+    def render(
+        self,
+        values: Mapping[str, str] = {},
+        children: str | None = None,
+        bundle: Bundle | None = None,
+    ) -> str:
+        chunks: List[str] = []
+        self.render_to(chunks.append, values, children, bundle)
+        return ''.join(chunks)
+
+    def render_to(
+        self,
+        write: Write,
+        values: Mapping[str, str] = {},
+        children: str | None = None,
+        bundle: Bundle | None = None,
+    ) -> None:
+        if self._plan is None:
+            return
+        uniques = UniquesGenerator(self._stable_ids)
+        frame = Frame(
+            self.file,
+            self._imports,
+            uniques,
+            UniquesPerComponent(uniques),
+            make_args(self.file.name, self.args_def, values, self.file, None),
+            None if children is None else _static_children(children),
+            assets=self.assets.html(self.file, bundle),
+        )
+        _render_with_assets(self._plan, frame, self._slots, write)
+
+
+def _static_children(html: str) -> Callable[[Write], None]:
+    def render_children(write: Write) -> None:
+        write(html)
+    return render_children
@@ -0,0 +1,62 @@
+from pathlib import Path
+from typing import Dict, List, Set
+from .imports import Imports
+import json
+
+
+# Files and the files they import, in the order of imports.
+# Components imported by many files are the same nodes of the graph,
+# since their paths are resolved and interned by the cache
+class ImportGraph:
+    edges: Dict[Path, List[Path]]
+
+    def __init__(self) -> None:
+        self.edges = dict()
+
+    # Adds the file and every component it uses, directly or not
+    def add(self, file: Path, imports: Imports) -> None:
+        self.edges[file] = [definition.file for definition in imports.values()]
+        stack = list(imports.values())
+        while len(stack) > 0:
+            definition = stack.pop()
+            if definition.file in self.edges:
+                continue
+            self.edges[definition.file] = [
+                imported.file for imported in definition.imports.values()
+            ]
+            stack.extend(definition.imports.values())
+
+    # Files using `path`, directly or not. They are to be rebuilt
+    # when it changes
+    def dependents(self, path: Path) -> Set[Path]:
+        importers: Dict[Path, List[Path]] = dict()
+        for file, imported in self.edges.items():
+            for dependency in imported:
+                importers.setdefault(dependency, []).append(file)
+        found: Set[Path] = set()
+        stack = [path]
+        while len(stack) > 0:
+            for importer in importers.get(stack.pop(), []):
+                if importer not in found:
+                    found.add(importer)
+                    stack.append(importer)
+        return found
+
+    def to_json(self) -> str:
+        return json.dumps({
+            str(file): [str(dependency) for dependency in imported]
+            for file, imported in sorted(self.edges.items())
+        }, indent=2)
+
+    # JSON strings are valid DOT ids
+    def to_dot(self) -> str:
+        lines = ['digraph imports {']
+        for file, imported in sorted(self.edges.items()):
+            lines.append(f"    {json.dumps(str(file))};")
+            for dependency in imported:
+                lines.append(
+                    f"    {json.dumps(str(file))}"
+                    f" -> {json.dumps(str(dependency))};"
+                )
+        lines.append('}')
+        return '\n'.join(lines)
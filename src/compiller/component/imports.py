@@ -1,8 +1,36 @@
 from dataclasses import dataclass
 from pathlib import Path
+import os
+import re
 from ..Source import Source
+from ..parser import DEFAULT_PARSER, parse
+from ..profiler import Profiler, span
 from .. import exceptions as ex
-from typing import Callable, Dict, List, TypeAlias, cast, Self
+from .cache import DiskCache
+from .files import SourceFiles
+from .plan import (
+    AssetsSlot,
+    Attr,
+    ChildrenSlot,
+    ComponentCall,
+    DynamicAttr,
+    Plan,
+    StartTag,
+    UniqueRef,
+    compile_plan,
+)
+from .styles import scope_stylesheet
+from typing import (
+    Dict,
+    List,
+    Mapping,
+    Sequence,
+    Set,
+    Tuple,
+    TypeAlias,
+    cast,
+    Self,
+)
 from functools import cached_property
 from bs4 import ResultSet, Tag
 
@@ -29,102 +57,472 @@ class ComponentDefinition:
     file: Path
     imports: Dict[str, Self]
     style_prefix: str
-    template: Tag | None
+    plan: Plan | None
     args_def: List[ComponentArgDefinition]
     script: str
+    # Class selectors are prefixed already
     stylesheet: str
+    # Usages with the same arguments and children render the same html,
+    # so it can be rendered once per page
+    shares_instances: bool
+    # The template has $children
+    takes_children: bool
 
     def get_global_css_class_name(self, local_css_class_name: str) -> str:
         return self.style_prefix + local_css_class_name
 
 
 Imports: TypeAlias = Dict[str, ComponentDefinition]
+# Imported files are looked for in every dir in order
+IncludeDirs: TypeAlias = Path | Sequence[Path]
+
+
+@dataclass(frozen=True)
+class ImportDeclaration:
+    alias: str
+    path: str
+    line: int | None
+
+
+# Everything that can be taken from a component file without
+# looking at the files it imports
+@dataclass(frozen=True)
+class _ParsedComponent:
+    imports: List[ImportDeclaration]
+    plan: Plan | None
+    args_def: List[ComponentArgDefinition]
+    script: str
+    stylesheet: str
+    # <template shared>: usages share instances even with unique ids
+    is_shared: bool
+
+
+class ImportsCache:
+    # Every file of a compilation is parsed with the same backend
+    parser: str
+    disk: DiskCache | None
+    profiler: Profiler | None
+    # Unique ids of pages compiled with the cache are stable
+    # (see UniquesGenerator) rather than numbered
+    stable_ids: bool
+    files: SourceFiles
+    _by_path: Dict[Path, ComponentDefinition]
+    # Reversed import graph: file -> files importing it
+    _importers: Dict[Path, Set[Path]]
+    # (import path, include dirs) -> file
+    _found: Dict[Tuple[str, Tuple[Path, ...]], Path]
+    # The same file is always the same object, whatever path led to it
+    _interned: Dict[Path, Path]
+
+    def __init__(
+        self,
+        disk_cache_dir: Path | None = None,
+        parser: str = DEFAULT_PARSER,
+        profiler: Profiler | None = None,
+        stable_ids: bool = False,
+    ) -> None:
+        self.parser = parser
+        self.profiler = profiler
+        self.stable_ids = stable_ids
+        self.files = SourceFiles()
+        if disk_cache_dir is None:
+            self.disk = None
+        else:
+            self.disk = DiskCache(disk_cache_dir, parser)
+        self._by_path = dict()
+        self._importers = dict()
+        self._found = dict()
+        self._interned = dict()
+
+    def get(self, path: Path) -> ComponentDefinition | None:
+        return self._by_path.get(path)
+
+    def add(self, definition: ComponentDefinition) -> None:
+        self._by_path[definition.file] = definition
+        for imported in definition.imports.values():
+            self._importers.setdefault(imported.file, set()).add(
+                definition.file
+            )
+
+    # Drops the file and every component depending on it.
+    # Returns paths of all of them
+    def invalidate(self, path: Path) -> Set[Path]:
+        # Created or deleted file may change where imports are found
+        self._found.clear()
+        path = _normalize(path)
+        self.files.invalidate(path)
+        invalidated: Set[Path] = set()
+        stack = [path]
+        while len(stack) > 0:
+            current = stack.pop()
+            if current in invalidated:
+                continue
+            invalidated.add(current)
+            self._by_path.pop(current, None)
+            stack.extend(self._importers.pop(current, set()))
+        return invalidated
+
+    def clear(self) -> None:
+        self._by_path.clear()
+        self._importers.clear()
+        self._found.clear()
+        self._interned.clear()
+        self.files.clear()
+
+    # The first include dir having the file wins. If none has,
+    # the path in the first one is returned to be reported missing.
+    # Paths are normalized, so a/../b.htmlp and b.htmlp are the same file
+    def find(self, path: str, include_dirs: List[Path]) -> Path:
+        key = (path, tuple(include_dirs))
+        found = self._found.get(key)
+        if found is None:
+            candidates = [_normalize(dir / path) for dir in include_dirs]
+            if len(candidates) == 1:
+                found = candidates[0]
+            else:
+                found = next(
+                    filter(self.files.exists, candidates),
+                    candidates[0],
+                )
+            found = self.intern(found)
+            self._found[key] = found
+        return found
+
+    # The same file is the same Path object, whichever way it's written
+    def intern(self, path: Path) -> Path:
+        path = _normalize(path)
+        return self._interned.setdefault(path, path)
+
+
+# Lexically, symlinks are not followed
+def _normalize(path: Path) -> Path:
+    return Path(os.path.normpath(path))
+
+
+def dependencies(imports: Imports) -> Set[Path]:
+    found: Set[Path] = set()
+    stack = list(imports.values())
+    while len(stack) > 0:
+        definition = stack.pop()
+        if definition.file in found:
+            continue
+        found.add(definition.file)
+        stack.extend(definition.imports.values())
+    return found
+
+
+# Files being imported, from the page down to the current one.
+# The set makes looking for recursion O(1)
+class _Route:
+    _files: List[Path]
+    _visiting: Set[Path]
+
+    def __init__(self, start: Path) -> None:
+        self._files = [start]
+        self._visiting = {start}
+
+    def push(self, path: Path) -> None:
+        if path in self._visiting:
+            raise ex.ImportRecursion(self._files + [path])
+        self._files.append(path)
+        self._visiting.add(path)
+
+    def pop(self) -> None:
+        self._visiting.discard(self._files.pop())
 
 
 def parse_imports_and_remove_them(
     source: Source,
-    include_dir: Path,
-    route: List[Path] | None = None,
+    include_dirs: IncludeDirs,
+    cache: ImportsCache,
 ) -> Imports:
-    if route is None:
-        route = [source.path]
-    _ensure_no_recursion(route)
+    return _resolve_imports(
+        source.path,
+        _pick_imports_and_remove_them(source),
+        _include_dirs_list(include_dirs),
+        cache,
+        _Route(source.path),
+    )
 
-    imports: Imports = dict()
-    for tag in source.tag.select('import'):
+
+# Component file compiled on its own rather than imported
+def load_component(
+    path: Path,
+    include_dirs: IncludeDirs,
+    cache: ImportsCache,
+) -> ComponentDefinition:
+    # Keyed the same way as imports, so invalidate() finds it
+    path = cache.intern(path)
+    return _parse_definition(
+        path,
+        None,
+        path,
+        _include_dirs_list(include_dirs),
+        cache,
+        _Route(path),
+    )
+
+
+# Component which is not a file, e.g. given as a string.
+# It's not cached
+def compile_component(
+    source: Source,
+    include_dirs: IncludeDirs,
+    cache: ImportsCache,
+) -> ComponentDefinition:
+    parsed = _parse_component(source)
+    imports = _resolve_imports(
+        source.path,
+        parsed.imports,
+        _include_dirs_list(include_dirs),
+        cache,
+        _Route(source.path),
+    )
+    return _make_definition(source.path, parsed, imports)
+
+
+def _include_dirs_list(include_dirs: IncludeDirs) -> List[Path]:
+    if isinstance(include_dirs, Path):
+        return [include_dirs]
+    return list(include_dirs)
+
+
+# Tags of the given names in document order, found in a single pass
+# over the tree. It's several times faster than CSS selectors
+def _index_tags(root: Tag, names: Set[str]) -> Dict[str, List[Tag]]:
+    index: Dict[str, List[Tag]] = {name: [] for name in names}
+    for element in root.descendants:
+        if isinstance(element, Tag) and element.name in index:
+            index[element.name].append(element)
+    return index
+
+
+def _pick_imports_and_remove_them(
+    source: Source,
+    tags: List[Tag] | None = None,
+) -> List[ImportDeclaration]:
+    if tags is None:
+        tags = _index_tags(source.tag, {'import'})['import']
+    declarations: List[ImportDeclaration] = []
+    for tag in tags:
         if 'path' not in tag.attrs.keys():
             raise ex.NoRequiredAttr(
-                'path', 'import', route[-1], tag.sourceline
+                'import', 'path', source.path, tag.sourceline
             )
-        path = include_dir / cast(str, tag['path'])
-
-        alias = tag.attrs.get('alias', path.stem).lower()
-        if alias in imports.keys():
-            raise ex.SameImportAliases(alias, source.path)
-        route.append(path)
-        imports[alias] = _parse_definition(
-            Source(source.path, tag),
-            path,
-            lambda src: parse_imports_and_remove_them(src, include_dir, route)
-        )
-        route.pop()
+        path = cast(str, tag['path'])
+        alias = tag.attrs.get('alias', Path(path).stem).lower()
+        declarations.append(ImportDeclaration(alias, path, tag.sourceline))
         tag.decompose()
-    return imports
-
-
-def _ensure_no_recursion(route: List[Path]) -> None:
-    if len(route) == 0:
-        return
-    if route.index(route[-1]) != len(route) - 1:
-        raise ex.ImportRecursion(route)
+    return declarations
 
 
-_cache_by_path: Dict[Path, ComponentDefinition] = dict()
+def _resolve_imports(
+    file: Path,
+    declarations: List[ImportDeclaration],
+    include_dirs: List[Path],
+    cache: ImportsCache,
+    route: _Route,
+) -> Imports:
+    imports: Imports = dict()
+    paths = [
+        cache.find(declaration.path, include_dirs)
+        for declaration in declarations
+    ]
+    # Files not parsed yet are read at once, each of them is parsed
+    # when its turn comes
+    unparsed = [path for path in paths if cache.get(path) is None]
+    cache.files.prefetch(unparsed)
+    try:
+        for [declaration, path] in zip(declarations, paths):
+            if declaration.alias in imports.keys():
+                raise ex.SameImportAliases(declaration.alias, file)
+            route.push(path)
+            imports[declaration.alias] = _parse_definition(
+                file,
+                declaration.line,
+                path,
+                include_dirs,
+                cache,
+                route,
+            )
+            route.pop()
+    finally:
+        cache.files.discard(unparsed)
+    return imports
 
 
-def clear_imports_cache():
-    global _cache_by_path
-    _cache_by_path = dict()
+def _parse_definition(
+    importer: Path,
+    import_line: int | None,
+    path: Path,
+    include_dirs: List[Path],
+    cache: ImportsCache,
+    route: _Route,
+) -> ComponentDefinition:
+    definition = cache.get(path)
+    if cache.profiler is not None:
+        cache.profiler.hit('memory', definition is not None)
+    if definition is None:
+        if not cache.files.exists(path):
+            raise ex.ImportedFileNotFound(path, importer, import_line)
+        parsed = _load_component(path, cache)
+        # Imported files are resolved every time rather than stored
+        # with the component, so changes in them are never missed
+        imports = _resolve_imports(
+            path, parsed.imports, include_dirs, cache, route
+        )
+        definition = _make_definition(path, parsed, imports)
+        cache.add(definition)
+    return definition
 
 
-def _parse_definition(
-    src: Source,
+def _make_definition(
     path: Path,
-    parse_imports: Callable[[Source], Imports],
+    parsed: _ParsedComponent,
+    imports: Imports,
 ) -> ComponentDefinition:
-    global _cache_by_path
-    if path not in _cache_by_path.keys():
-        if not path.exists():
-            raise ex.ImportedFileNotFound(path, src.path, src.tag.sourceline)
-        source = Source(path)
-        _check_for_disallowed_toplevel_tags(source)
-        imports = parse_imports(source)
-        style_prefix: str = _pick_style_prefix(path)
-        _cache_by_path[path] = ComponentDefinition(
-            path,
+    return ComponentDefinition(
+        path,
+        imports,
+        _pick_style_prefix(path),
+        parsed.plan,
+        parsed.args_def,
+        parsed.script,
+        parsed.stylesheet,
+        parsed.is_shared or _shares_instances(parsed.plan, imports),
+        _children_slots(parsed.plan) > 0,
+    )
+
+
+def _children_slots(plan: Plan | None) -> int:
+    slots = 0
+    stack = [plan or []]
+    while len(stack) > 0:
+        for node in stack.pop():
+            if isinstance(node, ChildrenSlot):
+                slots += 1
+            elif isinstance(node, ComponentCall):
+                stack.append(node.children)
+    return slots
+
+
+# Unique ids are different in every instance. Children are rendered
+# beforehand to compare them, so there may be only one place for them
+def _shares_instances(plan: Plan | None, imports: Imports) -> bool:
+    stack = [plan or []]
+    while len(stack) > 0:
+        for node in stack.pop():
+            if isinstance(node, AssetsSlot):
+                # Styles and scripts are written only once
+                return False
+            elif isinstance(node, ComponentCall):
+                if not imports[node.alias].shares_instances:
+                    return False
+                if _has_unique_refs(node.attrs):
+                    return False
+                stack.append(node.children)
+            elif isinstance(node, StartTag):
+                if _has_unique_refs(node.attrs):
+                    return False
+    return _children_slots(plan) <= 1
+
+
+def _has_unique_refs(attrs: List[Attr]) -> bool:
+    for attr in attrs:
+        if isinstance(attr, DynamicAttr):
+            for part in attr.parts:
+                if isinstance(part, UniqueRef):
+                    return True
+    return False
+
+
+def _load_component(path: Path, cache: ImportsCache) -> _ParsedComponent:
+    content = cache.files.read(path)
+    disk = cache.disk
+    if disk is None:
+        with span(cache.profiler, 'parse', path):
+            return _parse_component(Source(path, parse(content, cache.parser)))
+    key = disk.key(content, _pick_style_prefix(path))
+    parsed = disk.load(key)
+    is_hit = isinstance(parsed, _ParsedComponent)
+    if cache.profiler is not None:
+        cache.profiler.hit('disk', is_hit)
+    if is_hit:
+        return cast(_ParsedComponent, parsed)
+    with span(cache.profiler, 'parse', path):
+        parsed = _parse_component(Source(path, parse(content, cache.parser)))
+    disk.store(key, parsed)
+    return parsed
+
+
+def _parse_component(source: Source) -> _ParsedComponent:
+    _check_for_disallowed_toplevel_tags(source)
+    tags = _index_tags(source.tag, {'import', 'template'})
+    imports = _pick_imports_and_remove_them(source, tags['import'])
+    args_def = _pick_args_def(source)
+    prefix = _pick_style_prefix(source.path)
+    [stylesheet, classes] = scope_stylesheet(_pick_stylesheet(source), prefix)
+    return _ParsedComponent(
+        imports,
+        _compile_template(
+            source,
+            tags['template'],
             imports,
-            style_prefix,
-            _pick_template(source),
-            _pick_args_def(source),
-            _pick_script(source),
-            _pick_stylesheet(source),
-        )
-    return _cache_by_path[path]
+            args_def,
+            {name: prefix + name for name in classes},
+        ),
+        args_def,
+        _pick_script(source),
+        stylesheet,
+        _pick_is_shared(source),
+    )
+
+
+def _compile_template(
+    src: Source,
+    templates: List[Tag],
+    imports: List[ImportDeclaration],
+    args_def: List[ComponentArgDefinition],
+    classes: Mapping[str, str],
+) -> Plan | None:
+    template = _pick_template(src, templates)
+    if template is None:
+        return None
+    return compile_plan(
+        template.contents,
+        set(map(lambda i: i.alias, imports)),
+        set(map(lambda a: a.name, args_def)),
+        classes,
+    )
+
+
+_ALLOWED_TOPLEVEL_TAGS = ['template', 'style', 'script', 'import']
+
+
+def is_component(src: Source) -> bool:
+    for tag in src.tag.find_all(recursive=False):
+        if tag.name not in _ALLOWED_TOPLEVEL_TAGS:
+            return False
+    return True
 
 
 def _check_for_disallowed_toplevel_tags(src: Source) -> None:
-    allowed = ['template', 'style', 'scripts', 'import']
     for tag in src.tag.find_all(recursive=False):
-        if tag.name not in allowed:
+        if tag.name not in _ALLOWED_TOPLEVEL_TAGS:
             raise ex.ProhibitedTopLevelTag(tag, src.path)
 
 
+# Classes of Card.htmlp become Card-name
 def _pick_style_prefix(path_to_file: Path) -> str:
-    return path_to_file.stem
+    prefix = re.sub('[^\\w-]', '_', path_to_file.stem)
+    if re.match('-?[_a-zA-Z]', prefix) is None:
+        prefix = '_' + prefix
+    return prefix + '-'
 
 
+# Only top-level ones, <style> in the template stays where it is
 def _pick_stylesheet(src: Source) -> str:
-    styles: ResultSet[Tag] = src.tag.find_all('style')
+    styles: ResultSet[Tag] = src.tag.find_all('style', recursive=False)
     if len(styles) > 1:
         raise ex.MultipleTopLevelTags(styles, src.path)
     if len(styles) == 0:
@@ -136,16 +534,32 @@ def _pick_args_def(src: Source) -> List[ComponentArgDefinition]:
     template = cast(Tag, src.tag.find('template', recursive=False))
     if template is None:
         return []
-    args = str(template.get('args', '')).split()
-    defs = list(map(ComponentArgDefinition, args))
+    return parse_args_def(
+        str(template.get('args', '')),
+        src.path,
+        template.sourceline,
+    )
+
+
+# Declarations are the same as in <template args="...">
+def parse_args_def(
+    declarations: str,
+    file: Path | None = None,
+    line: int | None = None,
+) -> List[ComponentArgDefinition]:
+    defs = list(map(ComponentArgDefinition, declarations.split()))
     for d in defs:
         if d.name == "children":
-            raise ex.NoChildrenArg(src.path, template.sourceline)
+            raise ex.NoChildrenArg(file, line)
     return defs
 
 
-def _pick_template(src: Source) -> Tag | None:
-    templates = src.tag.select('template')
+def _pick_is_shared(src: Source) -> bool:
+    template = src.tag.find('template', recursive=False)
+    return isinstance(template, Tag) and template.has_attr('shared')
+
+
+def _pick_template(src: Source, templates: List[Tag]) -> Tag | None:
     if len(templates) > 1:
         raise ex.MultipleTopLevelTags(templates, src.path)
     if len(templates) == 0:
@@ -154,7 +568,7 @@ def _pick_template(src: Source) -> Tag | None:
 
 
 def _pick_script(src: Source) -> str:
-    scripts = src.tag.select('script')
+    scripts: ResultSet[Tag] = src.tag.find_all('script', recursive=False)
     if len(scripts) > 1:
         raise ex.MultipleTopLevelTags(scripts, src.path)
     if len(scripts) == 0:
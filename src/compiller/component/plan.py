@@ -0,0 +1,266 @@
+from dataclasses import dataclass
+import re
+import sys
+from typing import Iterable, List, Mapping, Set, Tuple, TypeAlias
+from bs4 import Doctype, NavigableString, PageElement, Tag
+from bs4.formatter import HTMLFormatter
+
+
+# Template compiled once into a flat list of nodes.
+# Everything which doesn't depend on arguments, uniques or children
+# is serialized beforehand, so instantiation only fills in the gaps.
+# Plans of pages (without arguments) are compiled the same way,
+# then only component usages are dynamic.
+# Nodes have slots and names are interned, since plans of every parsed
+# component are kept for the whole life of a watcher or a server.
+
+
+@dataclass(frozen=True, slots=True)
+class Text:
+    html: str
+
+
+@dataclass(frozen=True, slots=True)
+class StaticAttr:
+    name: str
+    value: str
+
+
+# <tag $name/>
+@dataclass(frozen=True, slots=True)
+class ArgNamedAttr:
+    arg_name: str
+
+
+# $name in an attribute value
+@dataclass(frozen=True, slots=True)
+class ArgRef:
+    name: str
+
+
+# !name in an attribute value. It's replaced by argument with the same
+# name if there is such an argument and it's given, by unique id otherwise
+@dataclass(frozen=True, slots=True)
+class UniqueRef:
+    name: str
+
+
+ValuePart: TypeAlias = str | ArgRef | UniqueRef
+
+
+# Value split into literal parts and placeholders once at compile time
+@dataclass(frozen=True, slots=True)
+class DynamicAttr:
+    name: str
+    parts: List[ValuePart]
+
+
+Attr: TypeAlias = StaticAttr | ArgNamedAttr | DynamicAttr
+
+
+# Start tag with at least one dynamic attribute.
+# Children and end tag are separate nodes
+@dataclass(frozen=True, slots=True)
+class StartTag:
+    name: str
+    attrs: List[Attr]
+    is_void: bool
+
+
+@dataclass(frozen=True, slots=True)
+class ChildrenSlot:
+    pass
+
+
+# Styles or scripts of used components go here, right before </head>
+# or </body>. Pages without <head> get styles right after <html>
+# or, without it, after the doctype
+@dataclass(frozen=True, slots=True)
+class AssetsSlot:
+    tag: str
+
+
+@dataclass(frozen=True, slots=True)
+class ComponentCall:
+    alias: str
+    attrs: List[Attr]
+    children: List['Node']
+    line: int | None
+
+
+Node: TypeAlias = Text | StartTag | ChildrenSlot | AssetsSlot | ComponentCall
+Plan: TypeAlias = List[Node]
+
+
+_FORMATTER = HTMLFormatter.REGISTRY['minimal']
+_CHILDREN_PLACEHOLDER = re.compile('\\s*\\$children\\s*')
+_ASSETS_TAGS = {'head', 'body'}
+# Whole words only, classes glued to placeholders are left as they are
+_CLASS_NAME = re.compile('(?<!\\S)[^\\s$!]+(?!\\S)')
+
+
+# `arg_names` is None for pages. Then nothing but component usages
+# is considered dynamic. `classes` renames classes in class attributes
+def compile_plan(
+    elements: Iterable[PageElement],
+    aliases: Set[str],
+    arg_names: Set[str] | None,
+    classes: Mapping[str, str] = {},
+) -> Plan:
+    builder = _PlanBuilder(aliases, arg_names, classes)
+    for element in elements:
+        builder.add(element)
+    return builder.finish()
+
+
+class _PlanBuilder:
+    _aliases: Set[str]
+    _arg_names: Set[str] | None
+    _classes: Mapping[str, str]
+    _placeholders: re.Pattern[str]
+    _plan: Plan
+    # Static html not yet merged into a Text node
+    _pending: List[str]
+
+    def __init__(
+        self,
+        aliases: Set[str],
+        arg_names: Set[str] | None,
+        classes: Mapping[str, str],
+    ):
+        self._aliases = aliases
+        self._arg_names = arg_names
+        self._classes = classes
+        self._placeholders = _placeholders_pattern(arg_names or set())
+        self._plan = []
+        self._pending = []
+
+    def finish(self) -> Plan:
+        self._flush()
+        return self._plan
+
+    def add(self, element: PageElement) -> None:
+        if isinstance(element, NavigableString):
+            self._add_string(element)
+            return
+        assert isinstance(element, Tag)
+        name = sys.intern(element.name)
+        attrs = self._compile_attrs(element)
+        if name in self._aliases:
+            self._add_node(ComponentCall(
+                name,
+                attrs,
+                compile_plan(
+                    element.contents,
+                    self._aliases,
+                    self._arg_names,
+                    self._classes,
+                ),
+                element.sourceline,
+            ))
+            return
+        static_attrs = [
+            (a.name, a.value) for a in attrs if isinstance(a, StaticAttr)
+        ]
+        if len(static_attrs) == len(attrs):
+            self._pending.append(start_tag(
+                name,
+                static_attrs,
+                element.is_empty_element,
+            ))
+        else:
+            self._add_node(
+                StartTag(name, attrs, element.is_empty_element)
+            )
+        if element.is_empty_element:
+            return
+        if name == 'html':
+            self._add_node(AssetsSlot(name))
+        for child in element.contents:
+            self.add(child)
+        if name in _ASSETS_TAGS:
+            self._add_node(AssetsSlot(name))
+        self._pending.append('</' + name + '>')
+
+    def _add_string(self, string: NavigableString) -> None:
+        is_template = self._arg_names is not None
+        if is_template and _CHILDREN_PLACEHOLDER.search(string):
+            self._add_node(ChildrenSlot())
+        else:
+            self._pending.append(string.output_ready(_FORMATTER))
+            if isinstance(string, Doctype):
+                self._add_node(AssetsSlot('doctype'))
+
+    def _compile_attrs(self, tag: Tag) -> List[Attr]:
+        attrs: List[Attr] = []
+        is_call = tag.name in self._aliases
+        for [name, value] in tag.attrs.items():
+            name = sys.intern(name)
+            if name == 'class' and not is_call and len(self._classes) > 0:
+                value = _CLASS_NAME.sub(
+                    lambda m: self._classes.get(m[0], m[0]),
+                    value,
+                )
+            if self._arg_names is None:
+                attrs.append(StaticAttr(name, value))
+            elif name.startswith('$') and name[1:] in self._arg_names:
+                attrs.append(ArgNamedAttr(sys.intern(name[1:])))
+            else:
+                parts = self._split_value(value)
+                if len(parts) == 1 and isinstance(parts[0], str):
+                    attrs.append(StaticAttr(name, value))
+                else:
+                    attrs.append(DynamicAttr(name, parts))
+        return attrs
+
+    def _split_value(self, value: str) -> List[ValuePart]:
+        parts: List[ValuePart] = []
+        end = 0
+        for match in self._placeholders.finditer(value):
+            if match.start() > end:
+                parts.append(value[end:match.start()])
+            if match.lastgroup == 'arg':
+                parts.append(ArgRef(sys.intern(match['arg'])))
+            else:
+                parts.append(UniqueRef(sys.intern(match['unique'])))
+            end = match.end()
+        if end < len(value) or len(parts) == 0:
+            parts.append(value[end:])
+        return parts
+
+    def _add_node(self, node: Node) -> None:
+        self._flush()
+        self._plan.append(node)
+
+    def _flush(self) -> None:
+        if len(self._pending) > 0:
+            self._plan.append(Text(''.join(self._pending)))
+            self._pending = []
+
+
+# Longer names go first, so $idx is never taken for $id followed by 'x'.
+# Unique ids which are not arguments must end the word
+def _placeholders_pattern(arg_names: Set[str]) -> re.Pattern[str]:
+    unique = '[A-Za-z_-]+(?=\\s|$)'
+    if len(arg_names) == 0:
+        return re.compile(f"!(?P<unique>{unique})")
+    names = '|'.join(map(re.escape, sorted(arg_names, key=len, reverse=True)))
+    return re.compile(
+        f"\\$(?P<arg>{names})|!(?P<unique>{names}|{unique})"
+    )
+
+
+# Serializes the same way bs4 does
+def start_tag(
+    name: str,
+    attrs: Iterable[Tuple[str, str]],
+    is_void: bool,
+) -> str:
+    html = '<' + name
+    for [attr, value] in sorted(attrs):
+        html += ' ' + attr + '=' + _FORMATTER.quoted_attribute_value(
+            _FORMATTER.attribute_value(value)
+        )
+    if is_void:
+        html += '/'
+    return html + '>'
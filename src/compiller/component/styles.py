@@ -0,0 +1,45 @@
+import re
+from typing import Set, Tuple
+
+
+# Comments and strings are matched whole, so braces and dots in them
+# are never taken for the structure of the stylesheet
+_STRUCTURE = re.compile(
+    '/\\*.*?\\*/|"(?:\\\\.|[^"\\\\])*"|\'(?:\\\\.|[^\'\\\\])*\'|[{};]',
+    re.S,
+)
+_CLASS_SELECTOR = re.compile(
+    '/\\*.*?\\*/|"(?:\\\\.|[^"\\\\])*"|\'(?:\\\\.|[^\'\\\\])*\''
+    '|\\.(-?[_a-zA-Z][\\w-]*)',
+    re.S,
+)
+
+
+# Prefixes class selectors of the component stylesheet, so they don't
+# clash with classes of other components. Returns the stylesheet
+# and the classes found in it. Only selectors are changed,
+# declarations and at-rule preludes are left as they are
+def scope_stylesheet(css: str, prefix: str) -> Tuple[str, Set[str]]:
+    classes: Set[str] = set()
+
+    def rename(match: re.Match[str]) -> str:
+        name = match[1]
+        if name is None:
+            return match[0]
+        classes.add(name)
+        return '.' + prefix + name
+
+    pieces = []
+    start = 0
+    for match in _STRUCTURE.finditer(css):
+        if match[0] == '{':
+            prelude = css[start:match.start()]
+            if not prelude.lstrip().startswith('@'):
+                prelude = _CLASS_SELECTOR.sub(rename, prelude)
+            pieces.append(prelude + '{')
+            start = match.end()
+        elif match[0] in (';', '}'):
+            pieces.append(css[start:match.end()])
+            start = match.end()
+    pieces.append(css[start:])
+    return ''.join(pieces), classes
@@ -1,37 +1,83 @@
-from typing import Dict
+from typing import Dict, List, Set
+import hashlib
 
 
-_count: int = 0
+# Letters only, so ids are CSS identifiers and need no escaping
+# in selectors
+_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+_BASE = len(_ALPHABET)
+# 52^6 is about 2e10 ids. Collisions within a page are resolved anyway
+_STABLE_LENGTH = 6
 
 
-def _get_next() -> str:
-    global _count
-    next_unique = ''
-    i = _count
-    while i > 0:
-        # for explanation see ascii table
-        next_unique += chr(i % (ord('z') - ord('A')) + ord('A'))
-        i //= ord('z') - ord('A')
-    if next_unique == '':
-        next_unique = 'A'
-    _count += 1
-    return next_unique
+# Every compilation has its own generator, so ids start from A in each
+# of them and compilations can run in parallel.
+# Stable ids are derived from where the component is used instead of
+# being numbered, so changing one part of a page doesn't renumber
+# ids in the rest of it
+class UniquesGenerator:
+    stable: bool
+    _count: int
+    _issued: Set[str]
 
+    def __init__(self, stable: bool = False) -> None:
+        self.stable = stable
+        self._count = 0
+        self._issued = set()
 
-def restart_uniques_generator():
-    global _count
-    _count = 0
+    def get_next(self) -> str:
+        digits: List[str] = []
+        i = self._count
+        while i > 0:
+            [i, digit] = divmod(i, _BASE)
+            digits.append(_ALPHABET[digit])
+        self._count += 1
+        if len(digits) == 0:
+            return _ALPHABET[0]
+        return ''.join(digits)
 
+    # `key` tells the usage and the id apart from others of the page
+    def get_stable(self, key: str) -> str:
+        salt = 0
+        while True:
+            digest = hashlib.blake2b(
+                f"{key}\0{salt}".encode(),
+                digest_size=8,
+            ).digest()
+            unique = _encode(int.from_bytes(digest), _STABLE_LENGTH)
+            if unique not in self._issued:
+                self._issued.add(unique)
+                return unique
+            salt += 1
 
+
+def _encode(number: int, length: int) -> str:
+    digits: List[str] = []
+    for _ in range(length):
+        [number, digit] = divmod(number, _BASE)
+        digits.append(_ALPHABET[digit])
+    return ''.join(digits)
+
+
+# `key` is where the component instance is, e.g. '/Card:0/Icon:2'
+# for the third Icon used by the first Card of the page
 class UniquesPerComponent:
+    key: str
+    _generator: UniquesGenerator
     _uniques_by_name: Dict[str, str]
 
-    def __init__(self) -> None:
+    def __init__(self, generator: UniquesGenerator, key: str = '') -> None:
+        self.key = key
+        self._generator = generator
         self._uniques_by_name = dict()
 
     def get_by_id(self, name: str) -> str:
         v = self._uniques_by_name.get(name)
         if v is not None:
             return v
-        self._uniques_by_name[name] = _get_next()
-        return self._uniques_by_name[name]
+        if self._generator.stable:
+            v = self._generator.get_stable(self.key + '!' + name)
+        else:
+            v = self._generator.get_next()
+        self._uniques_by_name[name] = v
+        return v
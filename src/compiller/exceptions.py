@@ -5,6 +5,13 @@ from os import getcwd
 from bs4 import Tag
 
 
+# Files outside the working directory are shown by their absolute path
+def _relative_to_cwd(file: Path) -> Path:
+    if file.is_relative_to(getcwd()):
+        return file.relative_to(getcwd())
+    return file
+
+
 def _assemble_location_string(
     file: Path | None,
     line: int | None = None
@@ -15,7 +22,7 @@ def _assemble_location_string(
         line1 = 'Unknown'
     else:
         line1 = str(line)
-    return f"Error in file {file.relative_to(getcwd())}, on line {line1}"
+    return f"Error in file {_relative_to_cwd(file)}, on line {line1}"
 
 
 class HtmlpException(Exception):
@@ -35,6 +42,19 @@ class HtmlpException(Exception):
         text = _assemble_location_string(file, line) + ':\n' + self.msg + '.'
         super().__init__(text)
 
+    # Subclasses have their own constructors so they are unpickled
+    # (e.g. when passed between processes) as plain HtmlpException
+    def __reduce__(self):
+        return (_restore_exception, (self.msg, self.file, self.line))
+
+
+def _restore_exception(
+    msg: str,
+    file: Path | None,
+    line: int | None,
+) -> HtmlpException:
+    return HtmlpException(msg, file=file, line=line)
+
 
 def add_location_context(
     e: HtmlpException,
@@ -65,7 +85,7 @@ class NoChildrenArg(HtmlpException):
 class ImportRecursion(HtmlpException):
     def __init__(self, route: Iterable[Path]):
         formatted_route: str = ' -> \n\t'.join(
-            map(lambda x: str(x.relative_to(getcwd())), route)
+            map(lambda x: str(_relative_to_cwd(x)), route)
         )
         super().__init__(
             'Import recursion',
@@ -0,0 +1,120 @@
+import re
+from typing import Any, Dict
+from bs4 import BeautifulSoup, Comment, Doctype, NavigableString, Tag
+from lxml import etree  # type: ignore
+from .utils import htmlBeautifulSoup
+
+
+# libxml2 does the tokenizing, the soup is assembled from its tree.
+# The result is the same as of html.parser: whitespace is collapsed
+# the same way and line numbers are kept for error messages
+def parse_lxml(data: str) -> BeautifulSoup:
+    # libxml2 moves <html>, <head> and <body> out of a <template>
+    # or drops them, so layout components are left to html.parser
+    if _DOCUMENT_TAG_IN_TEMPLATE.search(data) is not None:
+        return htmlBeautifulSoup(data)
+    builder = _LxmlSoupBuilder(etree.Comment)
+    if data.strip() == '':
+        return builder.soup
+    root = etree.fromstring(data, etree.HTMLParser())
+    if root is None:
+        return builder.soup
+    doctype = _DOCTYPE.match(data)
+    if doctype is not None:
+        builder.soup.append(Doctype(doctype['name']))
+        builder.append_string(builder.soup, doctype['space'])
+    for sibling in reversed(list(root.itersiblings(preceding=True))):
+        builder.append(builder.soup, sibling)
+    builder.append(builder.soup, root)
+    for sibling in root.itersiblings():
+        builder.append(builder.soup, sibling)
+    # libxml2 puts everything into <html>, <head> and <body>.
+    # They are unwrapped unless written in the source, so components
+    # and fragments keep their top level
+    for name in ['head', 'body', 'html']:
+        tag = builder.soup.find(name)
+        if tag is not None and _WRITTEN[name].search(data) is None:
+            tag.unwrap()
+    # libxml2 drops whatever follows </html>
+    trailing = _TRAILING_SPACE.search(data)
+    contents = builder.soup.contents
+    if trailing is not None and not isinstance(contents[-1], NavigableString):
+        builder.append_string(builder.soup, trailing[0])
+    return builder.soup
+
+
+_DOCTYPE = re.compile(
+    '\\s*<!DOCTYPE\\s+(?P<name>[^>]*)>(?P<space>\\s*)',
+    re.IGNORECASE,
+)
+_WRITTEN = {
+    name: re.compile(f"<{name}[\\s/>]", re.IGNORECASE)
+    for name in ['head', 'body', 'html']
+}
+_DOCUMENT_TAG_IN_TEMPLATE = re.compile(
+    '<template[\\s>].*?<(html|head|body)[\\s/>]',
+    re.IGNORECASE | re.DOTALL,
+)
+_TRAILING_SPACE = re.compile('\\s+$')
+# libxml2 gives them their name as a value when it's omitted
+_BOOLEAN_ATTRS = {
+    'checked', 'compact', 'declare', 'defer', 'disabled', 'ismap',
+    'multiple', 'nohref', 'noresize', 'noshade', 'nowrap', 'readonly',
+    'selected',
+}
+_WITHOUT_ASCII_SPACES = str.maketrans('', '', '\x20\x0a\x09\x0c\x0d')
+
+
+class _LxmlSoupBuilder:
+    soup: BeautifulSoup
+    # Tag of lxml comment elements
+    _comment: Any
+
+    def __init__(self, comment: Any) -> None:
+        self.soup = htmlBeautifulSoup('')
+        self._comment = comment
+
+    def append(self, parent: Tag, element: Any) -> None:
+        if element.tag is self._comment:
+            parent.append(Comment(element.text or ''))
+        elif isinstance(element.tag, str):
+            tag = Tag(
+                self.soup,
+                self.soup.builder,
+                element.tag,
+                attrs=_attrs(element.attrib),
+                sourceline=element.sourceline,
+            )
+            parent.append(tag)
+            self.append_string(tag, element.text)
+            for child in element:
+                self.append(tag, child)
+        # Processing instructions and entities are dropped
+        self.append_string(parent, element.tail)
+
+    # Mirrors BeautifulSoup.endData
+    def append_string(self, parent: Tag, text: str | None) -> None:
+        if text is None or text == '':
+            return
+        builder = self.soup.builder
+        ancestors = [parent, *parent.parents]
+        if text.translate(_WITHOUT_ASCII_SPACES) == '' and not any(
+            tag.name in builder.preserve_whitespace_tags for tag in ancestors
+        ):
+            text = '\n' if '\n' in text else ' '
+        container = NavigableString
+        for tag in ancestors:
+            if tag.name in builder.string_containers:
+                container = builder.string_containers[tag.name]
+                break
+        parent.append(container(text))
+
+
+# Explicit disabled="disabled" becomes disabled="" too,
+# which means the same
+def _attrs(attrib: Any) -> Dict[str, str]:
+    attrs = dict(attrib)
+    for name in _BOOLEAN_ATTRS.intersection(attrs.keys()):
+        if attrs[name] == name:
+            attrs[name] = ''
+    return attrs
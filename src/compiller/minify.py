@@ -0,0 +1,160 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from threading import Lock
+from time import perf_counter_ns
+from typing import Tuple
+from .atomic import AtomicWrite
+from .profiler import Profiler
+from .version import VERSION
+import hashlib
+
+
+_MEMORY_ENTRIES = 1024
+
+
+@dataclass(frozen=True, kw_only=True)
+class MinifyOptions:
+    css: bool = False
+    js: bool = False
+    keep_head_tags: bool = False
+
+    def apply(self, html: str) -> str:
+        from minify_html import minify
+        return minify(
+            html,
+            minify_css=self.css,
+            minify_js=self.js,
+            keep_html_and_head_opening_tags=self.keep_head_tags,
+        )
+
+
+# Minifies pages in a thread pool, so they are minified while next pages
+# are compiled. minify_html doesn't hold the GIL while working.
+# Results are cached by the hash of the page (and the options),
+# in memory and in `cache_dir` if it's given
+class Minifier:
+    options: MinifyOptions
+    _pool: ThreadPoolExecutor
+    _cache_dir: Path | None
+    # Pages minified last. Older ones are left on disk only
+    _memory: OrderedDict[str, str]
+    _lock: Lock
+
+    def __init__(
+        self,
+        options: MinifyOptions,
+        cache_dir: Path | None = None,
+        threads: int | None = None,
+    ) -> None:
+        self.options = options
+        self._pool = ThreadPoolExecutor(threads)
+        self._cache_dir = None if cache_dir is None else cache_dir / 'minify'
+        self._memory = OrderedDict()
+        self._lock = Lock()
+
+    def minify(self, html: str, profiler: Profiler | None = None) -> str:
+        return self.submit(html, profiler).result()
+
+    def submit(
+        self,
+        html: str,
+        profiler: Profiler | None = None,
+    ) -> 'Minified':
+        key = self._key(html)
+        cached = self._load(key)
+        if profiler is not None:
+            profiler.hit('minify', cached is not None)
+        if cached is not None:
+            return Minified(cached)
+        return Minified(self._pool.submit(self._minify, key, html), profiler)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown()
+
+    # Returns the result with the start and duration of minification
+    def _minify(self, key: str, html: str) -> Tuple[str, int, int]:
+        start = perf_counter_ns()
+        minified = self.options.apply(html)
+        duration = perf_counter_ns() - start
+        self._store(key, minified)
+        return minified, start, duration
+
+    def _key(self, html: str) -> str:
+        data = '\0'.join([
+            VERSION,
+            _minify_html_version(),
+            repr(self.options),
+            html,
+        ])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _load(self, key: str) -> str | None:
+        with self._lock:
+            minified = self._memory.get(key)
+            if minified is not None:
+                self._memory.move_to_end(key)
+                return minified
+        if self._cache_dir is None:
+            return None
+        try:
+            with open(self._cache_dir / key, encoding='utf-8') as file:
+                minified = file.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+        self._remember(key, minified)
+        return minified
+
+    def _store(self, key: str, minified: str) -> None:
+        self._remember(key, minified)
+        if self._cache_dir is None:
+            return
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._cache_dir / key
+        with AtomicWrite(path) as tmp:
+            tmp.file.write(minified.encode('utf-8'))
+
+    def _remember(self, key: str, minified: str) -> None:
+        with self._lock:
+            self._memory[key] = minified
+            self._memory.move_to_end(key)
+            if len(self._memory) > _MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+
+# Page being minified. Time spent on it is added to the profile
+# by the thread taking the result, so the profiler is never shared
+class Minified:
+    _value: str | Future[Tuple[str, int, int]]
+    _profiler: Profiler | None
+
+    def __init__(
+        self,
+        value: str | Future[Tuple[str, int, int]],
+        profiler: Profiler | None = None,
+    ) -> None:
+        self._value = value
+        self._profiler = profiler
+
+    def done(self) -> bool:
+        return isinstance(self._value, str) or self._value.done()
+
+    def result(self) -> str:
+        if isinstance(self._value, str):
+            return self._value
+        [minified, start, duration] = self._value.result()
+        if self._profiler is not None:
+            self._profiler.record('minify', None, start, duration)
+            self._profiler = None
+        self._value = minified
+        return minified
+
+
+# importlib.metadata takes longer to import than most of the compiler,
+# so it's left for runs which minify
+@cache
+def _minify_html_version() -> str:
+    from importlib.metadata import version
+    return version('minify_html')
@@ -0,0 +1,129 @@
+from pathlib import Path
+from stat import S_ISREG
+from typing import Callable, Dict, List
+from .atomic import AtomicWrite
+from .component.gen import Write
+import hashlib
+import json
+import os
+
+
+MANIFEST_NAME = '.htmlp-manifest.json'
+
+
+# Writes compiled files atomically and only if their content changes,
+# so modification times of unchanged files stay the same.
+# Hashes of written files are kept in the manifest between runs.
+# Without it files are read to compare with
+class Outputs:
+    written: int
+    unchanged: int
+    _manifest: Path | None
+    # path -> [sha256, mtime_ns, size]. The hash is trusted while
+    # the file has the same modification time and size
+    _entries: Dict[str, List]
+    _is_dirty: bool
+
+    def __init__(self, manifest: Path | None = None) -> None:
+        self.written = 0
+        self.unchanged = 0
+        self._manifest = manifest
+        self._entries = _load_manifest(manifest)
+        self._is_dirty = False
+
+    # Returns whether the file was changed
+    def write(self, path: Path, content: str) -> bool:
+        return self.stream(path, lambda write: write(content))
+
+    # `render` passes the content to `write` chunk by chunk.
+    # If it raises, a regular file is left as it was
+    def stream(self, path: Path, render: Callable[[Write], object]) -> bool:
+        if not _is_replaceable(path):
+            # Devices and pipes, e.g. /dev/stdout, are written as they are
+            with open(path, 'wb') as file:
+                def write_through(chunk: str) -> None:
+                    file.write(chunk.encode())
+                render(write_through)
+            self.written += 1
+            return True
+        # A symlink is followed, so the file it points to is replaced
+        target = path.resolve()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        with AtomicWrite(target) as tmp:
+            def write(chunk: str) -> None:
+                data = chunk.encode()
+                digest.update(data)
+                tmp.file.write(data)
+            render(write)
+            hash = digest.hexdigest()
+            if self._hash_of(path) == hash:
+                tmp.discard()
+                self.unchanged += 1
+                return False
+        self._remember(path, hash)
+        self.written += 1
+        return True
+
+    def reset_counters(self) -> None:
+        self.written = 0
+        self.unchanged = 0
+
+    def save(self) -> None:
+        if self._manifest is None or not self._is_dirty:
+            return
+        self._manifest.parent.mkdir(parents=True, exist_ok=True)
+        with AtomicWrite(self._manifest) as tmp:
+            tmp.file.write(
+                json.dumps(self._entries, indent=0, sort_keys=True).encode()
+            )
+        self._is_dirty = False
+
+    def _hash_of(self, path: Path) -> str | None:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        entry = self._entries.get(self._key(path))
+        if entry is not None and entry[1:] == [stat.st_mtime_ns, stat.st_size]:
+            return entry[0]
+        with open(path, 'rb') as file:
+            hash = hashlib.file_digest(file, 'sha256').hexdigest()
+        self._remember(path, hash)
+        return hash
+
+    def _remember(self, path: Path, hash: str) -> None:
+        stat = path.stat()
+        self._entries[self._key(path)] = [
+            hash,
+            stat.st_mtime_ns,
+            stat.st_size,
+        ]
+        self._is_dirty = True
+
+    # Paths are relative to the manifest, so output dirs can be moved
+    def _key(self, path: Path) -> str:
+        if self._manifest is None:
+            return str(path)
+        return os.path.relpath(path, self._manifest.parent)
+
+
+def _is_replaceable(path: Path) -> bool:
+    try:
+        return S_ISREG(path.stat().st_mode)
+    except FileNotFoundError:
+        return True
+
+
+def _load_manifest(manifest: Path | None) -> Dict[str, List]:
+    if manifest is None:
+        return dict()
+    try:
+        with open(manifest) as file:
+            entries = json.load(file)
+    except (OSError, ValueError):
+        # Broken manifest is the same as missing one
+        return dict()
+    if not isinstance(entries, dict):
+        return dict()
+    return entries
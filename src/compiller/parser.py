@@ -0,0 +1,42 @@
+from typing import TYPE_CHECKING, Callable, Dict, TypeAlias
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+
+ParserBackend: TypeAlias = Callable[[str], 'BeautifulSoup']
+
+
+DEFAULT_PARSER = 'html.parser'
+
+
+# Backends are imported on the first parse, so the command line
+# is parsed before bs4 is loaded
+def _html_parser(data: str) -> 'BeautifulSoup':
+    from .utils import htmlBeautifulSoup
+    return htmlBeautifulSoup(data)
+
+
+def _lxml(data: str) -> 'BeautifulSoup':
+    from .lxml_parser import parse_lxml
+    return parse_lxml(data)
+
+
+PARSERS: Dict[str, ParserBackend] = {
+    'html.parser': _html_parser,
+    'lxml': _lxml,
+}
+
+
+# Backends other than html.parser are optional dependencies
+def is_parser_available(parser: str) -> bool:
+    if parser != 'lxml':
+        return parser in PARSERS
+    try:
+        import lxml  # type: ignore # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parse(data: str, parser: str = DEFAULT_PARSER) -> 'BeautifulSoup':
+    return PARSERS[parser](data)
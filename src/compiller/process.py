@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import FrozenSet, Iterable, List, Tuple
+from .component.assets import Assets, Bundle
+from .component.graph import ImportGraph
+from .component.imports import (
+    Imports,
+    ImportsCache,
+    IncludeDirs,
+    dependencies,
+    is_component,
+    parse_imports_and_remove_them,
+)
+from .component.gen import Write, render_page
+from .component.uniques import UniquesGenerator
+from .parser import DEFAULT_PARSER
+from .profiler import Profiler, span
+from .Source import Source
+
+
+@dataclass(frozen=True)
+class Page:
+    html: str
+    # Every component file used by the page, including nested ones
+    dependencies: FrozenSet[Path]
+    # Styles and scripts of used components
+    assets: Assets
+
+
+def process_file(
+    path: Path,
+    include_dir: IncludeDirs,
+    cache_dir: Path | None = None,
+    parser: str = DEFAULT_PARSER,
+    profiler: Profiler | None = None,
+    stable_ids: bool = False,
+) -> str:
+    cache = ImportsCache(cache_dir, parser, profiler, stable_ids)
+    return process_source(_load_page(path, cache), include_dir, cache)
+
+
+# Passes the page to `write` chunk by chunk as it's rendered,
+# so the whole output is never held in memory
+def stream_file(
+    path: Path,
+    include_dir: IncludeDirs,
+    write: Write,
+    cache_dir: Path | None = None,
+    parser: str = DEFAULT_PARSER,
+    profiler: Profiler | None = None,
+    stable_ids: bool = False,
+) -> None:
+    cache = ImportsCache(cache_dir, parser, profiler, stable_ids)
+    _render(_load_page(path, cache), include_dir, cache, write)
+
+
+# Components parsed into the cache can be shared between pages
+def process_source(
+    src: Source,
+    include_dir: IncludeDirs,
+    cache: ImportsCache,
+) -> str:
+    return _process(src, include_dir, cache).html
+
+
+def process_page_source(
+    src: Source,
+    include_dir: IncludeDirs,
+    cache: ImportsCache,
+) -> Page:
+    return _process(src, include_dir, cache)
+
+
+# Resolves imports of the pages without rendering them.
+# Components among the pages are skipped
+def import_graph(
+    pages: Iterable[Path],
+    include_dir: IncludeDirs,
+    cache_dir: Path | None = None,
+    parser: str = DEFAULT_PARSER,
+) -> ImportGraph:
+    cache = ImportsCache(cache_dir, parser)
+    graph = ImportGraph()
+    for path in pages:
+        src = _load_page(path, cache)
+        if not is_component(src):
+            graph.add(
+                path,
+                parse_imports_and_remove_them(src, include_dir, cache),
+            )
+    return graph
+
+
+# Returns None if the file is a component rather than a page
+def process_page(
+    path: Path,
+    include_dir: IncludeDirs,
+    cache: ImportsCache,
+    bundle: Bundle | None = None,
+) -> Page | None:
+    src = _load_page(path, cache)
+    if is_component(src):
+        return None
+    return _process(src, include_dir, cache, bundle)
+
+
+def _load_page(path: Path, cache: ImportsCache) -> Source:
+    with span(cache.profiler, 'parse'):
+        return Source(path, parser=cache.parser)
+
+
+def _process(
+    src: Source,
+    include_dir: IncludeDirs,
+    cache: ImportsCache,
+    bundle: Bundle | None = None,
+) -> Page:
+    chunks: List[str] = []
+    [imports, assets] = _render(
+        src, include_dir, cache, chunks.append, bundle
+    )
+    return Page(''.join(chunks), frozenset(dependencies(imports)), assets)
+
+
+def _render(
+    src: Source,
+    include_dir: IncludeDirs,
+    cache: ImportsCache,
+    write: Write,
+    bundle: Bundle | None = None,
+) -> Tuple[Imports, Assets]:
+    with span(cache.profiler, 'imports'):
+        imports = parse_imports_and_remove_them(src, include_dir, cache)
+    with span(cache.profiler, 'render'):
+        assets = render_page(
+            imports,
+            src,
+            UniquesGenerator(cache.stable_ids),
+            write,
+            cache.profiler,
+            bundle,
+        )
+    return imports, assets
@@ -0,0 +1,141 @@
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Any, ContextManager, Dict, Iterator, List, Tuple
+import os
+
+
+@dataclass
+class Stats:
+    count: int = 0
+    ns: int = 0
+
+    def add(self, other: 'Stats') -> None:
+        self.count += other.count
+        self.ns += other.ns
+
+
+# Wall time of compilation phases, per component parse and render
+# numbers and cache hits. Compiling code checks for None before using it,
+# so nothing is spent on measuring when profiling is off.
+# Times of nested phases are included into outer ones
+class Profiler:
+    phases: Dict[str, Stats]
+    components: Dict[Tuple[str, Path], Stats]
+    # cache name -> [hits, misses]
+    caches: Dict[str, List[int]]
+    # Chrome trace events
+    events: List[Dict[str, Any]]
+
+    def __init__(self) -> None:
+        self.phases = dict()
+        self.components = dict()
+        self.caches = dict()
+        self.events = []
+
+    @contextmanager
+    def span(self, phase: str, file: Path | None = None) -> Iterator[None]:
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(phase, file, start, perf_counter_ns() - start)
+
+    def hit(self, cache: str, is_hit: bool) -> None:
+        counters = self.caches.setdefault(cache, [0, 0])
+        counters[0 if is_hit else 1] += 1
+
+    # Profiles of pages compiled in other processes are collected here
+    def merge(self, other: 'Profiler') -> None:
+        for [phase, stats] in other.phases.items():
+            self.phases.setdefault(phase, Stats()).add(stats)
+        for [key, stats] in other.components.items():
+            self.components.setdefault(key, Stats()).add(stats)
+        for [cache, [hits, misses]] in other.caches.items():
+            counters = self.caches.setdefault(cache, [0, 0])
+            counters[0] += hits
+            counters[1] += misses
+        self.events.extend(other.events)
+
+    def summary(self) -> str:
+        lines = [_row('Phase', 'Count', 'Total ms')]
+        for [phase, stats] in self.phases.items():
+            lines.append(_row(phase, stats.count, _ms(stats.ns)))
+        if len(self.components) > 0:
+            lines += ['', _row('Component', 'Count', 'Total ms')]
+            by_time = sorted(
+                self.components.items(),
+                key=lambda item: item[1].ns,
+                reverse=True,
+            )
+            for [[phase, file], stats] in by_time:
+                name = f"{phase} {_display_path(file)}"
+                lines.append(_row(name, stats.count, _ms(stats.ns)))
+        if len(self.caches) > 0:
+            lines += ['', _row('Cache', 'Hits', 'Misses')]
+            for [cache, [hits, misses]] in self.caches.items():
+                ratio = f"{hits / max(1, hits + misses):.0%}"
+                lines.append(_row(f"{cache} ({ratio})", hits, misses))
+        return '\n'.join(lines)
+
+    # Trace Event Format, opens in chrome://tracing and Perfetto
+    def trace(self) -> Dict[str, Any]:
+        return {
+            'traceEvents': self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'summary': self.summary()},
+        }
+
+    # For work measured elsewhere, e.g. in another thread
+    def record(
+        self,
+        phase: str,
+        file: Path | None,
+        start: int,
+        duration: int,
+    ) -> None:
+        if file is None:
+            stats = self.phases.setdefault(phase, Stats())
+        else:
+            stats = self.components.setdefault((phase, file), Stats())
+        stats.count += 1
+        stats.ns += duration
+        event: Dict[str, Any] = {
+            'name': phase,
+            'ph': 'X',
+            'ts': start / 1000,
+            'dur': duration / 1000,
+            'pid': os.getpid(),
+            'tid': 0,
+        }
+        if file is not None:
+            event['name'] = f"{phase} {_display_path(file)}"
+            event['args'] = {'file': str(file)}
+        self.events.append(event)
+
+
+# Convenient for coarse phases. Hot paths check for None themselves
+def span(
+    profiler: Profiler | None,
+    phase: str,
+    file: Path | None = None,
+) -> ContextManager[None]:
+    if profiler is None:
+        return nullcontext()
+    return profiler.span(phase, file)
+
+
+def _row(name: str, first: object, second: object) -> str:
+    return f"{name:<50} {first:>10} {second:>12}"
+
+
+def _ms(ns: int) -> str:
+    return f"{ns / 1_000_000:.2f}"
+
+
+def _display_path(path: Path) -> str:
+    try:
+        return str(path.relative_to(os.getcwd()))
+    except ValueError:
+        return str(path)
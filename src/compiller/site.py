@@ -0,0 +1,207 @@
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Set
+from .component.assets import Assets, Bundle
+from .component.imports import ImportsCache
+from .exceptions import HtmlpException
+from .parser import DEFAULT_PARSER
+from .profiler import Profiler
+from .process import process_page
+
+
+PAGE_SUFFIX = '.htmlp'
+
+
+@dataclass(frozen=True)
+class PageResult:
+    path: Path
+    html: str | None = None
+    error: HtmlpException | None = None
+    dependencies: FrozenSet[Path] = frozenset()
+    assets: Assets | None = None
+    # Only when built with profiling
+    profile: Profiler | None = None
+
+
+# Components are found here too. They are filtered out while compiling
+def find_pages(src_dir: Path) -> List[Path]:
+    return sorted(src_dir.rglob('*' + PAGE_SUFFIX))
+
+
+def output_path(page: Path, src_dir: Path, out_dir: Path) -> Path:
+    return out_dir / page.relative_to(src_dir).with_suffix('.html')
+
+
+# Results are yielded in the order of `pages` regardless of `jobs`
+def build_site(
+    pages: List[Path],
+    include_dir: Path,
+    jobs: int = 1,
+    cache_dir: Path | None = None,
+    parser: str = DEFAULT_PARSER,
+    profile: bool = False,
+    bundle: Bundle | None = None,
+    stable_ids: bool = False,
+) -> Iterator[PageResult]:
+    if jobs == 1:
+        cache = ImportsCache(cache_dir, parser, stable_ids=stable_ids)
+        for page in pages:
+            result = _build_page(page, include_dir, cache, profile, bundle)
+            if result is not None:
+                yield result
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    pool = ProcessPoolExecutor(
+        jobs,
+        initializer=_init_worker,
+        initargs=(cache_dir, parser, stable_ids),
+    )
+    with pool:
+        results = pool.map(
+            partial(
+                _build_page_in_worker,
+                include_dir=include_dir,
+                profile=profile,
+                bundle=bundle,
+            ),
+            pages,
+            chunksize=max(1, len(pages) // (jobs * 4)),
+        )
+        for result in results:
+            if result is not None:
+                yield result
+
+
+def _build_page(
+    page: Path,
+    include_dir: Path,
+    cache: ImportsCache,
+    profile: bool = False,
+    bundle: Bundle | None = None,
+) -> PageResult | None:
+    # Every page gets its own profile, so pages built in other processes
+    # can be sent back with their results
+    profiler = Profiler() if profile else None
+    cache.profiler = profiler
+    try:
+        compiled = process_page(page, include_dir, cache, bundle)
+    except HtmlpException as e:
+        return PageResult(page, error=e, profile=profiler)
+    finally:
+        cache.profiler = None
+    if compiled is None:
+        return None
+    return PageResult(
+        page,
+        html=compiled.html,
+        dependencies=compiled.dependencies,
+        assets=compiled.assets,
+        profile=profiler,
+    )
+
+
+# Every worker process warms up its own cache
+_worker_cache = ImportsCache()
+
+
+def _init_worker(
+    cache_dir: Path | None,
+    parser: str,
+    stable_ids: bool,
+) -> None:
+    global _worker_cache
+    _worker_cache = ImportsCache(cache_dir, parser, stable_ids=stable_ids)
+
+
+def _build_page_in_worker(
+    page: Path,
+    include_dir: Path,
+    profile: bool,
+    bundle: Bundle | None,
+) -> PageResult | None:
+    return _build_page(page, include_dir, _worker_cache, profile, bundle)
+
+
+# Keeps components between builds and recompiles only pages
+# affected by changed files
+class IncrementalBuild:
+    _pages: List[Path]
+    _src_dir: Path | None
+    _include_dir: Path
+    _cache: ImportsCache
+    _dependencies: Dict[Path, FrozenSet[Path]]
+    _failed: Set[Path]
+    _profile: bool
+    _bundle: Bundle | None
+
+    def __init__(
+        self,
+        pages: List[Path],
+        include_dir: Path,
+        src_dir: Path | None = None,
+        cache_dir: Path | None = None,
+        parser: str = DEFAULT_PARSER,
+        profile: bool = False,
+        bundle: Bundle | None = None,
+        stable_ids: bool = False,
+    ) -> None:
+        self._pages = list(pages)
+        self._src_dir = src_dir
+        self._include_dir = include_dir
+        self._cache = ImportsCache(cache_dir, parser, stable_ids=stable_ids)
+        self._dependencies = dict()
+        self._failed = set()
+        self._profile = profile
+        self._bundle = bundle
+
+    def build_all(self) -> Iterator[PageResult]:
+        return self._build(self._pages)
+
+    def rebuild(self, changed: Iterable[Path]) -> Iterator[PageResult]:
+        changed = set(changed)
+        affected: Set[Path] = set()
+        for path in changed:
+            affected |= self._cache.invalidate(path)
+            self._track_page_file(path)
+        # Failed pages may be fixed by any change, e.g. by a created file
+        to_build = [
+            page for page in self._pages
+            if page in changed
+            or page in self._failed
+            or not self._dependencies.get(page, frozenset()).isdisjoint(
+                affected
+            )
+        ]
+        return self._build(to_build)
+
+    def _track_page_file(self, path: Path) -> None:
+        if self._src_dir is None or path.suffix != PAGE_SUFFIX:
+            return
+        if not path.is_relative_to(self._src_dir):
+            return
+        if path.exists() and path not in self._pages:
+            self._pages.append(path)
+            self._pages.sort()
+        elif not path.exists() and path in self._pages:
+            self._pages.remove(path)
+            self._dependencies.pop(path, None)
+            self._failed.discard(path)
+
+    def _build(self, pages: List[Path]) -> Iterator[PageResult]:
+        for page in pages:
+            result = _build_page(
+                page,
+                self._include_dir,
+                self._cache,
+                self._profile,
+                self._bundle,
+            )
+            if result is None:
+                continue
+            if result.error is None:
+                self._failed.discard(page)
+                self._dependencies[page] = result.dependencies
+            else:
+                self._failed.add(page)
+            yield result
@@ -0,0 +1,64 @@
+from pathlib import Path
+from threading import Condition, Thread
+from time import monotonic
+from typing import Callable, Set
+
+
+# Receives changed paths and a function telling if newer changes arrived.
+# Returns False if it has given up because of them
+BuildFunction = Callable[[Set[Path], Callable[[], bool]], bool]
+
+
+# Sits between the file watcher and the compiler.
+# Bursts of events are collected into a single build which is started
+# only when the files have been quiet for `delay` seconds.
+# Build which is outdated by new events is abandoned and its paths
+# are merged into the next one
+class BuildScheduler:
+    _build: BuildFunction
+    _delay: float
+    _pending: Set[Path]
+    _last_change: float
+    _condition: Condition
+    _thread: Thread
+
+    def __init__(self, build: BuildFunction, delay: float = 0.1) -> None:
+        self._build = build
+        self._delay = delay
+        self._pending = set()
+        self._last_change = 0
+        self._condition = Condition()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def schedule(self, changed: Set[Path]) -> None:
+        with self._condition:
+            self._pending |= changed
+            self._last_change = monotonic()
+            self._condition.notify()
+
+    def is_outdated(self) -> bool:
+        with self._condition:
+            return len(self._pending) > 0
+
+    def _run(self) -> None:
+        while True:
+            changed = self._wait_for_changes()
+            if not self._build(changed, self.is_outdated):
+                with self._condition:
+                    self._pending |= changed
+
+    def _wait_for_changes(self) -> Set[Path]:
+        with self._condition:
+            while len(self._pending) == 0:
+                self._condition.wait()
+            while True:
+                left = self._last_change + self._delay - monotonic()
+                if left <= 0:
+                    break
+                self._condition.wait(left)
+            changed = self._pending
+            self._pending = set()
+            return changed
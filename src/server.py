@@ -0,0 +1,242 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Tuple
+from compiller import Compiler, HtmlpException, Source
+from compiller.parser import DEFAULT_PARSER, parse
+from minify_html import minify
+import asyncio
+import json
+import os
+import signal
+import socket as sockets
+
+
+# Requests and responses are JSON objects, one per line.
+# Request:
+#   {"input": "page.htmlp"} or {"source": "<html>...</html>"}
+#   optional: "include_dir", "minify", "id" (copied to the response),
+#   "path" (file name of "source" for error messages)
+# Response:
+#   {"html": "..."} or {"error": {"message": ..., "file": ..., "line": ...}}
+
+
+class BadRequest(Exception):
+    pass
+
+
+class SocketInUse(Exception):
+    pass
+
+
+async def serve(
+    socket: Path,
+    jobs: int,
+    cache_dir: Path | None = None,
+    parser: str = DEFAULT_PARSER,
+) -> None:
+    _remove_stale_socket(socket)
+    pool = ProcessPoolExecutor(
+        jobs,
+        initializer=_init_worker,
+        initargs=(cache_dir, parser),
+    )
+
+    async def on_connection(
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            await _handle_connection(reader, writer, pool)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_unix_server(
+        on_connection,
+        socket,
+        # Lines are JSON documents with whole pages in them
+        limit=2 ** 26,
+    )
+    # Stopped the same way as by Ctrl+C, so the socket is removed
+    task = asyncio.current_task()
+    if task is not None:
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM,
+            task.cancel,
+        )
+    print(f"Listening on {socket}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        socket.unlink(missing_ok=True)
+
+
+# A socket nobody listens on is left by a previous run which was killed
+def _remove_stale_socket(path: Path) -> None:
+    if not path.is_socket():
+        return
+    with sockets.socket(sockets.AF_UNIX) as client:
+        try:
+            client.connect(str(path))
+        except ConnectionRefusedError:
+            path.unlink()
+            return
+    raise SocketInUse(f"Another server is listening on {path}")
+
+
+# Requests of a single connection are answered in order,
+# different connections are served concurrently
+async def _handle_connection(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    pool: Executor,
+) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await reader.readline()
+        if line == b'':
+            return
+        if line.strip() == b'':
+            continue
+        try:
+            request = _parse_request(line)
+        except BadRequest as e:
+            response = _error_response({}, str(e))
+        else:
+            response = await loop.run_in_executor(
+                pool,
+                _compile_in_worker,
+                request,
+            )
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+
+def _parse_request(line: bytes) -> Dict[str, Any]:
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        raise BadRequest(f"Request is not a valid JSON: {e}")
+    if not isinstance(request, dict):
+        raise BadRequest('Request must be a JSON object')
+    if ('input' in request) == ('source' in request):
+        raise BadRequest("Request must have either 'input' or 'source'")
+    return request
+
+
+def _error_response(
+    request: Dict[str, Any],
+    message: str,
+    file: Path | None = None,
+    line: int | None = None,
+) -> Dict[str, Any]:
+    response: Dict[str, Any] = {
+        'error': {
+            'message': message,
+            'file': None if file is None else str(file),
+            'line': line,
+        },
+    }
+    if 'id' in request:
+        response['id'] = request['id']
+    return response
+
+
+# Components stay parsed between requests. Files they were parsed from
+# are checked before every request, so edits are never missed
+class _Workspace:
+    _compiler: Compiler
+    _stamps: Dict[Path, Tuple[int, int]]
+
+    def __init__(self, compiler: Compiler) -> None:
+        self._compiler = compiler
+        self._stamps = dict()
+
+    def compile(self, src: Source) -> str:
+        self._drop_changed()
+        page = self._compiler.compile_source(src)
+        for path in page.dependencies:
+            stamp = _stamp(path)
+            if stamp is not None:
+                self._stamps[path] = stamp
+        return page.html
+
+    def _drop_changed(self) -> None:
+        changed = [
+            path for [path, stamp] in self._stamps.items()
+            if _stamp(path) != stamp
+        ]
+        for path in changed:
+            for invalidated in self._compiler.invalidate(path):
+                self._stamps.pop(invalidated, None)
+
+
+def _stamp(path: Path) -> Tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+_worker_cache_dir: Path | None = None
+_worker_parser = DEFAULT_PARSER
+# Imports are resolved against the include dir,
+# so components can't be shared between different ones
+_workspaces: Dict[Path, _Workspace] = dict()
+
+
+def _init_worker(cache_dir: Path | None, parser: str) -> None:
+    global _worker_cache_dir, _worker_parser
+    _worker_cache_dir = cache_dir
+    _worker_parser = parser
+
+
+def _compile_in_worker(request: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        html = _compile(request)
+    except HtmlpException as e:
+        return _error_response(request, e.msg, e.file, e.line)
+    except (OSError, UnicodeDecodeError) as e:
+        return _error_response(request, str(e))
+    except BadRequest as e:
+        return _error_response(request, str(e))
+    response: Dict[str, Any] = {'html': html}
+    if 'id' in request:
+        response['id'] = request['id']
+    return response
+
+
+def _compile(request: Dict[str, Any]) -> str:
+    input = _optional_path(request, 'input')
+    include_dir = _optional_path(request, 'include_dir')
+    if include_dir is None:
+        include_dir = Path.cwd() if input is None else input.parent
+    workspace = _workspaces.get(include_dir)
+    if workspace is None:
+        workspace = _Workspace(
+            Compiler(include_dir, _worker_cache_dir, _worker_parser)
+        )
+        _workspaces[include_dir] = workspace
+    if input is not None:
+        src = Source(input, parser=_worker_parser)
+    else:
+        source = request['source']
+        if not isinstance(source, str):
+            raise BadRequest("'source' must be a string")
+        path = _optional_path(request, 'path') or include_dir / '<source>'
+        src = Source(path, parse(source, _worker_parser))
+    html = workspace.compile(src)
+    if request.get('minify', False):
+        html = minify(html)
+    return html
+
+
+def _optional_path(request: Dict[str, Any], key: str) -> Path | None:
+    value = request.get(key)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise BadRequest(f"'{key}' must be a string")
+    return Path(os.path.abspath(value))
@@ -0,0 +1,88 @@
+from pathlib import Path
+from typing import Callable, Iterable, List, Set
+from compiller import PageResult
+from compiller.site import PAGE_SUFFIX
+from watchdog.observers import Observer
+from watchdog.events import (
+    FileSystemEventHandler,
+    FileSystemEvent,
+    FileSystemMovedEvent,
+)
+import os
+from scheduler import BuildScheduler
+
+
+class Watcher(FileSystemEventHandler):
+    def __init__(
+        self,
+        on_change: Callable[[Set[Path]], None],
+        ignored: List[Path],
+    ) -> None:
+        super().__init__()
+        self._on_change = on_change
+        self._ignored = ignored
+
+    def on_modified(self, event: FileSystemEvent) -> None:
+        self._changed(event)
+
+    def on_created(self, event: FileSystemEvent) -> None:
+        self._changed(event)
+
+    def on_deleted(self, event: FileSystemEvent) -> None:
+        self._changed(event)
+
+    def on_moved(self, event: FileSystemMovedEvent) -> None:
+        self._changed(event)
+
+    def _changed(self, event: FileSystemEvent) -> None:
+        if event.is_directory:
+            return
+        paths = [event.src_path]
+        if isinstance(event, FileSystemMovedEvent):
+            paths.append(event.dest_path)
+        changed = set(filter(
+            self._is_interesting,
+            map(lambda path: Path(os.fsdecode(path)).absolute(), paths),
+        ))
+        if len(changed) > 0:
+            self._on_change(changed)
+
+    # Editors' swap files and compiled pages are not
+    def _is_interesting(self, path: Path) -> bool:
+        if path.suffix != PAGE_SUFFIX:
+            return False
+        for ignored in self._ignored:
+            if path == ignored or path.is_relative_to(ignored):
+                return False
+        return True
+
+
+# `finish` is called after every complete rebuild
+def watch(
+    dirs: List[Path],
+    ignored: List[Path],
+    rebuild: Callable[[Set[Path]], Iterable[PageResult]],
+    write_page: Callable[[PageResult], object],
+    finish: Callable[[], object],
+) -> None:
+    def build(changed: Set[Path], is_outdated: Callable[[], bool]) -> bool:
+        for path in sorted(changed):
+            print(f"File {path} was modified.")
+        for page in rebuild(changed):
+            write_page(page)
+            if is_outdated():
+                return False
+        finish()
+        return True
+
+    scheduler = BuildScheduler(build)
+    observer = Observer()
+    event_handler = Watcher(scheduler.schedule, ignored)
+    for dir in dirs:
+        observer.schedule(event_handler, str(dir), recursive=True)
+    scheduler.start()
+    observer.start()
+    try:
+        observer.join()
+    except KeyboardInterrupt:
+        return